@@ -14,7 +14,7 @@ with DAG(
   default_args={"retries": 2},
   description="Training pipeline for gemstone prediction",
   schedule=timedelta(days=1),
-  start_date=pendulum.datetime(2025, 01, 08, tz=ZoneInfo("Asia/Jakarta")),
+  start_date=pendulum.datetime(2025, 1, 8, tz=ZoneInfo("Asia/Jakarta")),
   catchup=False,
   tags=["machine_learning ","classification", "fraud_detection", "imbalanced_dataset"],
 ) as dag:
@@ -1,14 +1,131 @@
-from fastapi import FastAPI, Request
+import argparse
+import asyncio
+import math
+import time
+from contextlib import asynccontextmanager, nullcontext
+from functools import partial
+from fastapi import FastAPI, Request, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
+from pydantic import ValidationError
 from uvicorn import run as app_run
 from typing import Optional
 
-from machine_failure.pipeline.prediction_pipeline import MachineClassifier, MachineData
+from machine_failure.entity.config_entity import ServingConfig
+from machine_failure.entity.machine_state import MachineStateStore
+from machine_failure.logger.custom_logging import logging
+from machine_failure.pipeline.prediction_pipeline import FAILURE_FLAGS, MachineArrayData, MachineBatchData, MachineClassifier
+from machine_failure.serving.admission import BATCH, SINGLE, AdmissionController, RequestShed
+from machine_failure.serving.batcher import PredictionBatcher
+from machine_failure.serving.executor import InferenceExecutor
+from machine_failure.serving.metrics import registry, stage_timer
+from machine_failure.serving.prediction_cache import PredictionCache
+from machine_failure.serving.prefork import serve_prefork
+from machine_failure.serving.schemas import MachineReading, MachineReadingColumns, MachineReadings
+from machine_failure.serving.stream import PredictionStream
+from machine_failure.serving.reloader import ModelReloader
+
+model = MachineClassifier()
+serving_config = ServingConfig()
+stage_timer.enabled = serving_config.stage_timing_enabled
+executor = InferenceExecutor(model, serving_config.executor_kind, serving_config.executor_max_workers)
+# every input format is decoded into arrays, the compiled preprocessing scores them without building a DataFrame
+batcher = PredictionBatcher(partial(executor.run, "predict_arrays"), serving_config.micro_batch_max_size,
+                            serving_config.micro_batch_max_wait_ms, concat_fn=MachineArrayData.concat,
+                            validate_fn=MachineArrayData.validate)
+prediction_cache = PredictionCache(serving_config.prediction_cache_max_entries, serving_config.prediction_cache_ttl_seconds,
+                                   serving_config.prediction_cache_resolution) if serving_config.prediction_cache_enabled else None
+reloader = ModelReloader(model, executor, serving_config.hot_reload_poll_interval_seconds, serving_config.warm_up_batch_size)
+admission = AdmissionController(serving_config.admission_max_in_flight, serving_config.admission_batch_max_in_flight,
+                                serving_config.admission_max_queue) if serving_config.admission_enabled else None
+
+NPY_CONTENT_TYPE = "application/x-npy"
+ARROW_CONTENT_TYPE = "application/vnd.apache.arrow.stream"
+BINARY_CONTENT_TYPES = (NPY_CONTENT_TYPE, ARROW_CONTENT_TYPE)
+DEADLINE_HEADER = "x-deadline-ms"
+REQUEST_PRIORITIES = {"/predict": SINGLE, "/predict/batch": BATCH}
+
+startup_state = {"status": "starting", "phase_seconds": {}, "preloaded": False}
+
+def preload_model():
+  # runs in the pre-fork master, the workers inherit the loaded and warmed model copy-on-write
+  phase_started = time.perf_counter()
+  model.load()
+  model.warm_up(serving_config.warm_up_batch_size)
+  startup_state["phase_seconds"]["preload"] = time.perf_counter() - phase_started
+  startup_state["preloaded"] = True
+  logging.info(f"Startup phase preload took {startup_state['phase_seconds']['preload']:.3f}s")
+
+async def warm_up_model():
+  try:
+    if serving_config.warm_up_enabled and not startup_state["preloaded"]:
+      phase_started = time.perf_counter()
+      await executor.run("load")
+      startup_state["phase_seconds"]["model_load"] = time.perf_counter() - phase_started
+      logging.info(f"Startup phase model_load took {startup_state['phase_seconds']['model_load']:.3f}s")
+
+      phase_started = time.perf_counter()
+      await executor.warm_up(serving_config.warm_up_batch_size)
+      startup_state["phase_seconds"]["warm_up"] = time.perf_counter() - phase_started
+      logging.info(f"Startup phase warm_up took {startup_state['phase_seconds']['warm_up']:.3f}s")
+    await reloader.start(poll=serving_config.hot_reload_enabled)
+    startup_state["status"] = "ready"
+  except Exception as e:
+    logging.error(f"Model warm-up failed: {e}")
+    startup_state["status"] = "failed"
+    startup_state["error"] = str(e)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+  phase_started = time.perf_counter()
+  executor.start()
+  if serving_config.micro_batch_enabled:
+    await batcher.start()
+  startup_state["phase_seconds"]["pool_start"] = time.perf_counter() - phase_started
+  logging.info(f"Startup phase pool_start took {startup_state['phase_seconds']['pool_start']:.3f}s")
+  # the model is loaded and warmed in the background so liveness is answered right away
+  warm_up_task = asyncio.create_task(warm_up_model())
+  yield
+  warm_up_task.cancel()
+  await reloader.stop()
+  await batcher.stop()
+  executor.shutdown()
+
+app = FastAPI(lifespan=lifespan)
+
+@app.middleware("http")
+async def admission_control(request: Request, call_next):
+  priority = REQUEST_PRIORITIES.get(request.url.path)
+  if admission is None or priority is None or request.method != "POST":
+    return await call_next(request)
+  default_ms = serving_config.single_deadline_ms if priority == SINGLE else serving_config.batch_deadline_ms
+  try:
+    deadline_ms = float(request.headers.get(DEADLINE_HEADER, default_ms))
+  except ValueError:
+    deadline_ms = default_ms
+  if not math.isfinite(deadline_ms) or deadline_ms <= 0:
+    deadline_ms = default_ms
+  # the route takes the slot once the input is validated, invalid input never holds one
+  request.state.admission = (priority, asyncio.get_running_loop().time() + deadline_ms / 1000)
+  try:
+    return await call_next(request)
+  except RequestShed as e:
+    return JSONResponse(content={"status": "error", "error": str(e), "reason": e.reason}, status_code=e.status_code,
+                        headers={"Retry-After": str(int(e.retry_after))})
+
+def admitted(request: Request):
+  """
+  Admission slot for scoring request, the deadline counting from its arrival.
+  A no-op for requests the admission middleware lets through unchecked.
+  """
+  ticket = getattr(request.state, "admission", None)
+  if ticket is None:
+    return nullcontext()
+  priority, deadline = ticket
+  return admission.admit(priority, deadline - asyncio.get_running_loop().time())
 
-app = FastAPI()
 templates = Jinja2Templates(directory='templates')
 origins = ["*"]
 app.add_middleware(
@@ -19,8 +136,6 @@ app.add_middleware(
   allow_headers=["*"],
 )
 
-model = MachineClassifier()
-
 class DataForm:
   def __init__(self, request: Request):
     self.request: Request = request
@@ -36,42 +151,180 @@ class DataForm:
     self.PWF: Optional[int] = None
     self.OSF: Optional[int] = None
 
-  async def get_machine_data(self):
+  async def get_machine_data(self) -> MachineReading:
     form = await self.request.form()
-    self.product_id = int(form.get("product_id"))
-    self.type = form.get("type")
-    self.air_temperature = float(form.get("air_temperature"))
-    self.process_temperature = float(form.get("process_temperature"))
-    self.rotational_speed = int(form.get("rotational_speed"))
-    self.torque = float(form.get("torque"))
-    self.tool_wear = int(form.get("tool_wear"))
-    self.TWF = 1 if form.get("TWF") else 0
-    self.HDF = 1 if form.get("HDF") else 0
-    self.PWF = 1 if form.get("PWF") else 0
-    self.OSF = 1 if form.get("OSF") else 0
+    # validated like a JSON body, bad form input is a 422 instead of reaching the model
+    reading = MachineReading.model_validate({
+      **{name: form.get(name) for name in MachineReading.model_fields if name not in FAILURE_FLAGS},
+      # the failure flags are checkboxes, present when ticked
+      **{flag: 1 if form.get(flag) else 0 for flag in FAILURE_FLAGS},
+    })
+    for name, value in reading:
+      setattr(self, name, value)
+    return reading
 
 @app.get("/", tags=["authentication"])
 async def index(request: Request):
   return templates.TemplateResponse("index.html",{"request": request, "context": "Rendering"})
 
+async def read_binary_input(content_type: str, request: Request) -> MachineArrayData:
+  if content_type.startswith(NPY_CONTENT_TYPE):
+    return MachineArrayData.from_npy(await request.body())
+  return MachineArrayData.from_arrow(await request.body())
+
+async def predict_reading(data: MachineArrayData):
+  value = None
+  if prediction_cache is not None:
+    # the version is read before scoring, a result of a model swapped out meanwhile is not cached
+    model_version = reloader.served_version
+    cache_key = prediction_cache.make_key(data.reading(0))
+    value = prediction_cache.get(cache_key, model_version)
+  if value is None:
+    if serving_config.micro_batch_enabled:
+      value = (await batcher.submit(data))[0]
+    else:
+      value = (await executor.run("predict_arrays", data))[0]
+    if prediction_cache is not None:
+      prediction_cache.put(cache_key, value, model_version)
+  return value
+
+async def parse_reading(request: Request, content_type: str) -> MachineArrayData:
+  if content_type.startswith("application/json"):
+    with stage_timer.time("parse_request", format="json"):
+      reading = MachineReading.model_validate(await request.json())
+    with stage_timer.time("build_input"):
+      return reading.to_machine_data().convert_to_array()
+  if content_type.startswith(BINARY_CONTENT_TYPES):
+    with stage_timer.time("parse_request", format="binary"):
+      data = await read_binary_input(content_type, request)
+    if len(data) != 1:
+      raise ValueError(f"Expected one reading, got {len(data)}, use /predict/batch")
+    return data
+
+  form = DataForm(request)
+  with stage_timer.time("parse_request", format="form"):
+    reading = await form.get_machine_data()
+  with stage_timer.time("build_input"):
+    return reading.to_machine_data().convert_to_array()
+
+async def parse_batch(request: Request, content_type: str) -> MachineArrayData:
+  with stage_timer.time("parse_request", format="batch"):
+    if content_type.startswith("multipart/form-data"):
+      form = await request.form()
+      readings = MachineReadings.model_validate(MachineBatchData.from_csv(await form.get("file").read()).records)
+    elif content_type.startswith("text/csv"):
+      readings = MachineReadings.model_validate(MachineBatchData.from_csv(await request.body()).records)
+    elif content_type.startswith(BINARY_CONTENT_TYPES):
+      return await read_binary_input(content_type, request)
+    else:
+      body = await request.json()
+      if isinstance(body, dict):
+        return MachineReadingColumns.model_validate(body).to_array_data()
+      # every row is validated like a single reading, a bad row is a 422 instead of reaching the model
+      readings = MachineReadings.model_validate(body)
+  with stage_timer.time("build_input"):
+    return readings.to_array_data()
+
 @app.post("/predict")
 async def predictRouteClient(request: Request):
+  content_type = request.headers.get("content-type", "")
+  # malformed input is the client's error, anything failing after parsing is ours
+  try:
+    data = await parse_reading(request, content_type)
+  except ValidationError as e:
+    return JSONResponse(content={"status": "error", "error": str(e), "color": "text-red-600"}, status_code=422)
+  except Exception as e:
+    return JSONResponse(content={"status": "error", "error": str(e), "color": "text-red-600"}, status_code=400)
+
   try:
-    form = DataForm(request)
-    await form.get_machine_data()
-    
-    machine_data = MachineData(form.product_id, form.type, form.air_temperature, 
-                              form.process_temperature, form.rotational_speed, form.torque, 
-                              form.tool_wear, form.TWF, form.HDF, form.PWF, form.OSF)
-    df = machine_data.convert_to_pandas()
-    value = model.predict(df)[0]
+    async with admitted(request):
+      value = await predict_reading(data)
     status = 'Machine Failure' if value == 1 else 'Machine is OK'
+    if content_type.startswith(("application/json",) + BINARY_CONTENT_TYPES):
+      return JSONResponse(content={"label": int(value), "status": status})
     color = "text-red-600" if value == 1 else "text-green-600"
 
     return JSONResponse(content={"status": status, "color": color})
       
+  except RequestShed:
+    raise
   except Exception as e:
     return JSONResponse(content={"status": "error", "error": str(e), "color": "text-red-600"}, status_code=500)
 
+@app.post("/predict/batch")
+async def predictBatchRouteClient(request: Request):
+  try:
+    data = await parse_batch(request, request.headers.get("content-type", ""))
+  except ValidationError as e:
+    return JSONResponse(content={"status": "error", "error": str(e)}, status_code=422)
+  except Exception as e:
+    return JSONResponse(content={"status": "error", "error": str(e)}, status_code=400)
+
+  if len(data) == 0:
+    return JSONResponse(content={"status": "error", "error": "Empty batch"}, status_code=400)
+  if len(data) > serving_config.max_batch_size:
+    return JSONResponse(content={"status": "error", 
+                                 "error": f"Batch size {len(data)} exceeds the limit of {serving_config.max_batch_size}"}, 
+                        status_code=413)
+
+  try:
+    async with admitted(request):
+      labels, proba = await executor.run("predict_with_proba_arrays", data)
+    predictions = [
+      {"label": int(label), "probability": float(p), "status": 'Machine Failure' if label == 1 else 'Machine is OK'}
+      for label, p in zip(labels, proba[:, 1])
+    ]
+    return JSONResponse(content={"count": len(predictions), "predictions": predictions})
+
+  except RequestShed:
+    raise
+  except Exception as e:
+    return JSONResponse(content={"status": "error", "error": str(e)}, status_code=500)
+
+# rolling per-machine state of streamed readings, every pre-fork worker keeps its own
+machine_state = MachineStateStore(serving_config.machine_state_window, serving_config.machine_state_max_machines)
+
+@app.websocket("/predict/stream")
+async def predictStream(websocket: WebSocket):
+  # readings of all open streams are coalesced by the same batcher as single /predict requests
+  predict_fn = batcher.submit if serving_config.micro_batch_enabled else partial(executor.run, "predict_arrays")
+  await PredictionStream(websocket, predict_fn, serving_config.stream_max_buffered, serving_config.stream_max_batch,
+                         serving_config.stream_overflow, machine_state).run()
+
+@app.get("/health/live")
+async def live():
+  return JSONResponse(content={"status": "alive"})
+
+@app.get("/health/ready")
+async def ready():
+  status_code = 200 if startup_state["status"] == "ready" else 503
+  return JSONResponse(content=startup_state, status_code=status_code)
+
+@app.post("/admin/reload")
+async def reload_model():
+  try:
+    return JSONResponse(content=await reloader.reload(force=True))
+  except Exception as e:
+    return JSONResponse(content={"status": "error", "error": str(e), **reloader.status()}, status_code=500)
+
+@app.get("/admin/model")
+async def served_model():
+  return JSONResponse(content=reloader.status())
+
+@app.get("/metrics")
+async def metrics():
+  return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
-  app_run(app, host='0.0.0.0', port=3000)
\ No newline at end of file
+  parser = argparse.ArgumentParser(description="Machine failure prediction API")
+  parser.add_argument('--host', default='0.0.0.0')
+  parser.add_argument('--port', type=int, default=3000)
+  parser.add_argument('--workers', type=int, default=serving_config.prefork_workers,
+                      help="Worker processes sharing one preloaded model, 1 runs a single process")
+  args = parser.parse_args()
+  if args.workers > 1:
+    if serving_config.executor_kind != "thread":
+      raise SystemExit("Pre-fork serving shares the model with thread executors, set serving.executor.kind to thread")
+    serve_prefork(app, args.workers, args.host, args.port, preload=preload_model, after_fork=model.after_fork)
+  else:
+    app_run(app, host=args.host, port=args.port)
\ No newline at end of file
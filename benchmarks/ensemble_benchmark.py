@@ -0,0 +1,48 @@
+"""
+Latency of the fitted VotingClassifier against the flattened CompactTreeEnsemble and against
+the members running concurrently (use_parallel_members) per batch size.
+
+usage: python benchmarks/ensemble_benchmark.py --model artifact/model_trainer/model.pkl
+"""
+import argparse
+import os
+import time
+import numpy as np
+
+from machine_failure.entity.tree_ensemble import CompactTreeEnsemble
+from machine_failure.utils.main_utils import load_object
+
+def time_per_call(func, iterations: int) -> float:
+  func()
+  started_at = time.perf_counter()
+  for _ in range(iterations):
+    func()
+  return (time.perf_counter() - started_at) / iterations
+
+def main():
+  parser = argparse.ArgumentParser(description="Tree ensemble latency benchmark")
+  parser.add_argument('--model', required=True, help="Path of a pickled MachineFailureModel")
+  parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 8, 64, 512])
+  parser.add_argument('--iterations', type=int, default=50)
+  parser.add_argument('--cpu-budget', type=int, default=os.cpu_count(), help="Threads shared by the parallel members")
+  args = parser.parse_args()
+
+  model = load_object(args.model)
+  voting_classifier = model.trained_model_object
+  started_at = time.perf_counter()
+  ensemble = CompactTreeEnsemble(voting_classifier)
+  print(f"flattened {len(ensemble.roots)} trees in {time.perf_counter() - started_at:.3f}s, {ensemble.nbytes / 1e6:.2f} MB of node arrays")
+
+  rng = np.random.default_rng(0)
+  model.use_parallel_members(args.cpu_budget)
+  print(f"{'rows':>6} {'sklearn ms':>12} {'compact ms':>12} {'parallel ms':>12} {'max abs diff':>14}")
+  for batch_size in args.batch_sizes:
+    X = rng.normal(size=(batch_size, voting_classifier.n_features_in_))
+    max_diff = np.max(np.abs(voting_classifier.predict_proba(X) - ensemble.predict_proba(X)))
+    sklearn_time = time_per_call(lambda: voting_classifier.predict_proba(X), args.iterations)
+    compact_time = time_per_call(lambda: ensemble.predict_proba(X), args.iterations)
+    parallel_time = time_per_call(lambda: model._voting_proba(X, parallel=True), args.iterations)
+    print(f"{batch_size:>6} {sklearn_time * 1e3:>12.3f} {compact_time * 1e3:>12.3f} {parallel_time * 1e3:>12.3f} {max_diff:>14.2e}")
+
+if __name__ == '__main__':
+  main()
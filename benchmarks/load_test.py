@@ -0,0 +1,211 @@
+"""
+Throughput and tail latency of the prediction API under load. Starts app.py serving a pickled
+model from the local disk (LOCAL_MODEL_PATH, no S3), or targets a running server with --url,
+drives it with an async load generator and writes a JSON report that can be kept per commit
+and compared with --baseline.
+
+rate:   open loop, requests start on a fixed schedule whatever the responses. Latency counts
+        from the scheduled start, so a stalled server shows up in the tail instead of slowing
+        the load down.
+closed: --concurrency clients, each sends its next request when the previous one returns.
+
+Readings cycle through a pool of --pool distinct rows, a pool larger than
+serving.prediction_cache.max_entries keeps the prediction cache out of the measurement.
+
+usage: python benchmarks/load_test.py --model artifact/model_trainer/model.pkl --mode rate --rate 200 --output report.json
+       python benchmarks/load_test.py --model artifact/model_trainer/model.pkl --mode closed --concurrency 16 --kind batch
+       python benchmarks/load_test.py --model artifact/model_trainer/model.pkl --baseline report.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+import httpx
+import numpy as np
+
+from machine_failure.pipeline.prediction_pipeline import INPUT_COLUMNS, make_synthetic_batch
+
+FORM_NAMES = {column: name for name, column in INPUT_COLUMNS.items()}
+# report fields compared against a baseline, True when higher is better
+COMPARED = {"throughput_rps": True, "rows_per_second": True, "error_rate": False,
+            "latency_ms.p50": False, "latency_ms.p95": False, "latency_ms.p99": False}
+
+def make_readings(pool: int) -> List[Dict[str, Any]]:
+  df = make_synthetic_batch(pool, seed=7).rename(columns=FORM_NAMES)
+  return json.loads(df.to_json(orient='records'))
+
+def make_payloads(readings: List[Dict[str, Any]], kind: str, batch_rows: int) -> Tuple[str, List[Any]]:
+  if kind == "single":
+    return "/predict", readings
+  return "/predict/batch", [readings[i:i + batch_rows] for i in range(0, len(readings) - batch_rows + 1, batch_rows)]
+
+def free_port() -> int:
+  with socket.socket() as sock:
+    sock.bind(("127.0.0.1", 0))
+    return sock.getsockname()[1]
+
+def start_server(model_path: str, port: int, workers: int, timeout: float) -> subprocess.Popen:
+  env = dict(os.environ, LOCAL_MODEL_PATH=os.path.abspath(model_path))
+  server = subprocess.Popen([sys.executable, "app.py", "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers)],
+                            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+  stop_at = time.monotonic() + timeout
+  while time.monotonic() < stop_at:
+    if server.poll() is not None:
+      raise SystemExit(f"app.py exited with status {server.returncode} before becoming ready")
+    try:
+      if httpx.get(f"http://127.0.0.1:{port}/health/ready").status_code == 200:
+        return server
+    except httpx.TransportError:
+      pass
+    time.sleep(0.2)
+  server.terminate()
+  raise SystemExit(f"app.py was not ready after {timeout:.0f}s")
+
+async def send(client: httpx.AsyncClient, path: str, payload: Any, started_at: float,
+               results: List[Tuple[float, str]]) -> None:
+  try:
+    response = await client.post(path, json=payload)
+    outcome = str(response.status_code)
+  except httpx.HTTPError as e:
+    outcome = type(e).__name__
+  results.append((time.perf_counter() - started_at, outcome))
+
+async def run_rate(client: httpx.AsyncClient, path: str, payloads: List[Any], rate: float, duration: float,
+                   results: List[Tuple[float, str]]) -> None:
+  tasks = []
+  started_at = time.perf_counter()
+  for i in range(int(rate * duration)):
+    scheduled_at = started_at + i / rate
+    delay = scheduled_at - time.perf_counter()
+    if delay > 0:
+      await asyncio.sleep(delay)
+    tasks.append(asyncio.create_task(send(client, path, payloads[i % len(payloads)], scheduled_at, results)))
+  await asyncio.gather(*tasks)
+
+async def run_closed(client: httpx.AsyncClient, path: str, payloads: List[Any], concurrency: int, duration: float,
+                     results: List[Tuple[float, str]]) -> None:
+  stop_at = time.perf_counter() + duration
+  async def user(index: int) -> None:
+    while time.perf_counter() < stop_at:
+      await send(client, path, payloads[index % len(payloads)], time.perf_counter(), results)
+      index += concurrency
+  await asyncio.gather(*(user(index) for index in range(concurrency)))
+
+async def drive(args: argparse.Namespace, url: str, path: str, payloads: List[Any], duration: float) -> Tuple[List[Tuple[float, str]], float]:
+  results: List[Tuple[float, str]] = []
+  limits = httpx.Limits(max_connections=None if args.mode == "rate" else args.concurrency)
+  async with httpx.AsyncClient(base_url=url, limits=limits, timeout=args.timeout) as client:
+    started_at = time.perf_counter()
+    if args.mode == "rate":
+      await run_rate(client, path, payloads, args.rate, duration, results)
+    else:
+      await run_closed(client, path, payloads, args.concurrency, duration, results)
+    return results, time.perf_counter() - started_at
+
+def git_commit() -> Optional[str]:
+  try:
+    return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+  except (OSError, subprocess.CalledProcessError):
+    return None
+
+def build_report(args: argparse.Namespace, results: List[Tuple[float, str]], elapsed: float) -> Dict[str, Any]:
+  latencies = np.array([latency for latency, _ in results]) * 1000
+  outcomes = Counter(outcome for _, outcome in results)
+  ok = sum(count for outcome, count in outcomes.items() if outcome.startswith("2"))
+  rows_per_request = 1 if args.kind == "single" else args.batch_rows
+  settings = {key: value for key, value in vars(args).items() if key not in ("output", "baseline")}
+  return {
+    "commit": git_commit(),
+    "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    "settings": settings,
+    "requests": len(results),
+    "duration_seconds": round(elapsed, 3),
+    "throughput_rps": round(len(results) / elapsed, 2),
+    "rows_per_second": round(ok * rows_per_request / elapsed, 2),
+    "error_rate": round(1 - ok / len(results), 4) if results else 0.0,
+    "status_counts": dict(outcomes),
+    "latency_ms": {
+      "mean": round(float(latencies.mean()), 3),
+      "p50": round(float(np.percentile(latencies, 50)), 3),
+      "p95": round(float(np.percentile(latencies, 95)), 3),
+      "p99": round(float(np.percentile(latencies, 99)), 3),
+      "max": round(float(latencies.max()), 3),
+    } if results else {},
+  }
+
+def lookup(report: Dict[str, Any], key: str) -> Optional[float]:
+  value: Any = report
+  for part in key.split("."):
+    value = value.get(part) if isinstance(value, dict) else None
+  return value
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+  print(f"compared with {baseline.get('commit')} ({baseline.get('timestamp')})")
+  changed = {key: (baseline.get("settings", {}).get(key), value) for key, value in report["settings"].items()
+             if baseline.get("settings", {}).get(key) != value}
+  if changed:
+    print(f"  settings differ, the numbers are not comparable: {changed}")
+  for key, higher_is_better in COMPARED.items():
+    new, old = lookup(report, key), lookup(baseline, key)
+    if new is None or old is None:
+      continue
+    change = (new - old) / old * 100 if old else 0.0
+    better = change == 0 or (change > 0) == higher_is_better
+    print(f"  {key:<16} {old:>12.3f} -> {new:>12.3f} {change:>+8.1f}% {'' if better else '(worse)'}")
+
+def main():
+  parser = argparse.ArgumentParser(description="Prediction API load test")
+  parser.add_argument('--model', help="Path of a pickled MachineFailureModel served by a local app.py")
+  parser.add_argument('--url', help="Base URL of a running server instead of starting app.py")
+  parser.add_argument('--workers', type=int, default=1, help="Pre-fork workers of the started app.py")
+  parser.add_argument('--mode', choices=["rate", "closed"], default="rate")
+  parser.add_argument('--rate', type=float, default=100.0, help="Requests per second in rate mode")
+  parser.add_argument('--concurrency', type=int, default=8, help="Clients in closed mode")
+  parser.add_argument('--kind', choices=["single", "batch"], default="single")
+  parser.add_argument('--batch-rows', type=int, default=100, help="Readings per /predict/batch request")
+  parser.add_argument('--pool', type=int, default=20000, help="Distinct readings the requests cycle through")
+  parser.add_argument('--duration', type=float, default=30.0, help="Seconds of measured load")
+  parser.add_argument('--warm-up', type=float, default=5.0, help="Seconds of load before measuring")
+  parser.add_argument('--timeout', type=float, default=30.0, help="Seconds before a request counts as failed")
+  parser.add_argument('--startup-timeout', type=float, default=120.0)
+  parser.add_argument('--output', help="Write the JSON report to this file instead of stdout")
+  parser.add_argument('--baseline', help="JSON report of an earlier run to compare with")
+  args = parser.parse_args()
+  if (args.model is None) == (args.url is None):
+    parser.error("give exactly one of --model and --url")
+
+  path, payloads = make_payloads(make_readings(args.pool), args.kind, args.batch_rows)
+  server = None
+  url = args.url
+  if url is None:
+    port = free_port()
+    server = start_server(args.model, port, args.workers, args.startup_timeout)
+    url = f"http://127.0.0.1:{port}"
+  try:
+    if args.warm_up > 0:
+      asyncio.run(drive(args, url, path, payloads, args.warm_up))
+    results, elapsed = asyncio.run(drive(args, url, path, payloads, args.duration))
+  finally:
+    if server is not None:
+      server.terminate()
+      server.wait()
+
+  report = build_report(args, results, elapsed)
+  if args.output:
+    with open(args.output, "w") as report_file:
+      json.dump(report, report_file, indent=2)
+    print(f"report written to {args.output}")
+  else:
+    print(json.dumps(report, indent=2))
+  if args.baseline:
+    with open(args.baseline) as baseline_file:
+      compare(report, json.load(baseline_file))
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,107 @@
+"""
+Memory per worker and total throughput of forked scoring workers, with the model loaded once
+in the parent and inherited copy-on-write ("shared") against every worker loading its own
+copy ("independent"). PSS splits shared pages between the processes using them, so the sum
+of PSS is the real memory used by all workers together.
+
+usage: python benchmarks/prefork_benchmark.py --model artifact/model_trainer/model.pkl --workers 1 2 4 8
+"""
+import argparse
+import multiprocessing
+import os
+import time
+from typing import Dict, Optional
+
+from machine_failure.entity.config_entity import ServingConfig
+from machine_failure.entity.model import MachineFailureModel
+from machine_failure.pipeline.prediction_pipeline import MachineArrayData, make_synthetic_batch
+from machine_failure.serving.prefork import freeze_heap
+from machine_failure.utils.main_utils import load_object
+
+def load_serving_model(model_path: str) -> MachineFailureModel:
+  serving_config = ServingConfig()
+  model = load_object(model_path)
+  if serving_config.preprocessing_mode == "compiled":
+    model.compile(serving_config.preprocessing_dtype)
+  if serving_config.inference_backend != "sklearn":
+    model.use_backend(serving_config.inference_backend, serving_config.compact_max_rows)
+  model.predict_with_proba(make_synthetic_batch(64))
+  return model
+
+def memory_kb(pid: int) -> Dict[str, int]:
+  values = {}
+  with open(f"/proc/{pid}/smaps_rollup") as smaps:
+    for line in smaps:
+      parts = line.split()
+      if len(parts) == 3 and parts[2] == "kB":
+        values[parts[0].rstrip(":")] = int(parts[1])
+  return {"rss": values["Rss"], "pss": values["Pss"], "uss": values["Private_Clean"] + values["Private_Dirty"]}
+
+def worker(model: Optional[MachineFailureModel], model_path: str, duration: float, batch_rows: int,
+           ready, start, finished, results) -> None:
+  if model is None:
+    model = load_serving_model(model_path)
+  data = MachineArrayData.from_columns(make_synthetic_batch(batch_rows, seed=os.getpid()))
+  ready.release()
+  start.wait()
+  rows = 0
+  stop_at = time.perf_counter() + duration
+  while time.perf_counter() < stop_at:
+    model.predict_with_proba_arrays(data.numeric, data.types)
+    rows += len(data)
+  results.put((os.getpid(), rows))
+  # stay alive until the parent has read the memory counters
+  finished.wait()
+
+def run(mode: str, workers: int, model_path: str, duration: float, batch_rows: int) -> Dict[str, float]:
+  context = multiprocessing.get_context("fork")
+  model = None
+  if mode == "shared":
+    model = load_serving_model(model_path)
+    freeze_heap()
+  ready, start, finished, results = context.Semaphore(0), context.Event(), context.Event(), context.Queue()
+  processes = [context.Process(target=worker, args=(model, model_path, duration, batch_rows, ready, start, finished, results))
+               for _ in range(workers)]
+  for process in processes:
+    process.start()
+  for _ in processes:
+    ready.acquire()
+  start.set()
+  rows = dict(results.get() for _ in processes)
+  memory = [memory_kb(process.pid) for process in processes]
+  finished.set()
+  for process in processes:
+    process.join()
+  # in the shared mode the parent plays the pre-fork master and keeps the model alive
+  parent = memory_kb(os.getpid()) if mode == "shared" else {"pss": 0}
+  return {
+    "rss_mb": sum(m["rss"] for m in memory) / len(memory) / 1024,
+    "pss_mb": sum(m["pss"] for m in memory) / len(memory) / 1024,
+    "uss_mb": sum(m["uss"] for m in memory) / len(memory) / 1024,
+    "total_pss_mb": (sum(m["pss"] for m in memory) + parent["pss"]) / 1024,
+    "rows_per_second": sum(rows.values()) / duration,
+  }
+
+def main():
+  parser = argparse.ArgumentParser(description="Pre-fork memory and throughput benchmark")
+  parser.add_argument('--model', required=True, help="Path of a pickled MachineFailureModel")
+  parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+  parser.add_argument('--duration', type=float, default=5.0, help="Seconds each worker scores for")
+  parser.add_argument('--batch-rows', type=int, default=1, help="Rows per predict call, 1 is the /predict case")
+  args = parser.parse_args()
+
+  print(f"{'mode':<12} {'workers':>7} {'RSS/worker':>11} {'PSS/worker':>11} {'USS/worker':>11} {'total PSS':>10} {'rows/sec':>10}")
+  for workers in args.workers:
+    for mode in ("independent", "shared"):
+      # every run starts from a fresh process so the previous runs do not share its pages
+      context = multiprocessing.get_context("fork")
+      queue = context.Queue()
+      runner = context.Process(target=lambda: queue.put(run(mode, workers, args.model, args.duration, args.batch_rows)))
+      runner.start()
+      result = queue.get()
+      runner.join()
+      print(f"{mode:<12} {workers:>7} {result['rss_mb']:>9.1f}MB {result['pss_mb']:>9.1f}MB {result['uss_mb']:>9.1f}MB "
+            f"{result['total_pss_mb']:>8.1f}MB {result['rows_per_second']:>10.0f}")
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,53 @@
+"""
+Per-row latency of the sklearn preprocessing pipeline against the compiled NumPy path.
+
+usage: python benchmarks/preprocessing_benchmark.py --model artifact/model_trainer/model.pkl
+"""
+import argparse
+import time
+import numpy as np
+
+from machine_failure.pipeline.prediction_pipeline import MachineData
+from machine_failure.utils.main_utils import load_object
+
+def time_per_call(func, iterations: int) -> float:
+  func()
+  started_at = time.perf_counter()
+  for _ in range(iterations):
+    func()
+  return (time.perf_counter() - started_at) / iterations
+
+def main():
+  parser = argparse.ArgumentParser(description="Preprocessing latency benchmark")
+  parser.add_argument('--model', required=True, help="Path of a pickled MachineFailureModel")
+  parser.add_argument('--iterations', type=int, default=2000)
+  parser.add_argument('--dtype', default="float64")
+  args = parser.parse_args()
+
+  model = load_object(args.model)
+  machine_data = MachineData(14860, 'M', 298.1, 308.6, 1551, 42.8, 108, 0, 0, 0, 0)
+  preprocessing_object = model.preprocessing_object
+  max_error = model.compile(args.dtype)
+  compiled = model.compiled_preprocessor
+
+  expected = preprocessing_object.transform(machine_data.convert_to_pandas())
+  array_data = machine_data.convert_to_array()
+  actual = compiled.transform_arrays(array_data.numeric, array_data.types)
+  print(f"max abs error on verification sample: {max_error:.3e}, on benchmark row: {np.max(np.abs(expected - actual)):.3e}")
+
+  results = {
+    "sklearn transform": time_per_call(lambda: preprocessing_object.transform(machine_data.convert_to_pandas()), args.iterations),
+    "compiled transform": time_per_call(lambda: (lambda data: compiled.transform_arrays(data.numeric, data.types))(
+      machine_data.convert_to_array()), args.iterations),
+  }
+  model.compiled_preprocessor = None
+  results["sklearn predict"] = time_per_call(lambda: model.predict_with_proba(machine_data.convert_to_pandas()), args.iterations // 10)
+  model.compiled_preprocessor = compiled
+  results["compiled predict"] = time_per_call(lambda: (lambda data: model.predict_with_proba_arrays(data.numeric, data.types))(
+    machine_data.convert_to_array()), args.iterations // 10)
+
+  for name, seconds in results.items():
+    print(f"{name:<20} {seconds * 1e6:>10.1f} us/row")
+
+if __name__ == '__main__':
+  main()
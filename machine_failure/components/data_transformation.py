@@ -2,7 +2,6 @@ import os
 import sys
 import pandas as pd
 import numpy as np
-from sklearn.base import BaseEstimator, TransformerMixin
 from sklearn.compose import ColumnTransformer
 from sklearn.preprocessing import StandardScaler, OrdinalEncoder
 from sklearn.pipeline import Pipeline
@@ -12,23 +11,12 @@ from machine_failure.logger.custom_logging import logging
 from machine_failure.utils.main_utils import drop_columns, read_yaml_file, read_csv, save_numpy_array_data, save_object
 from machine_failure.entity.config_entity import DataTransformationConfig
 from machine_failure.entity.artifact_entity import DataIngestionArtifact, DataValidationArtifact, DataTransformationArtifact
+from machine_failure.entity.machine_state import MachineStateStore, replay_rolling_features
+# imported here as well, models pickled before the generator moved to the entity layer reference this module
+from machine_failure.entity.feature_generator import FeatureGenerator
 
 params = read_yaml_file("config/param.yaml")
 
-class FeatureGenerator(BaseEstimator, TransformerMixin):
-  def fit(self, X, y=None):
-    return self
-
-  def transform(self, X):
-    data = X.copy()
-    # Create new features
-    data['Power'] = data['Torque [Nm]'] * data['Rotational speed [rpm]']
-    data['Temp Ratio'] = data['Process temperature [K]'] / data['Air temperature [K]']
-    data['Torque X Tool wear'] = data['Torque [Nm]'] * data['Tool wear [min]']
-    max_tool_wear = data['Tool wear [min]'].max()
-    data['Tool Wear Rate'] = data['Tool wear [min]'] / max_tool_wear
-    return data
-
 class DataTransformation:
   def __init__(self, data_ingestion_artifact: DataIngestionArtifact, data_validation_artifact: DataValidationArtifact):
     self.config = DataTransformationConfig()
@@ -66,7 +54,27 @@ class DataTransformation:
     except Exception as e:
       logging.error("Error in cls DataTransformation method create_preprocessor: {e}")
       raise CustomException(e, sys)
-    
+
+  def replay_machine_state(self, train_df: pd.DataFrame, test_df: pd.DataFrame) -> str:
+    """
+    Replay all readings in the order they were taken through the MachineStateStore used
+    when serving streams, and save the rolling features of every reading by id
+    return: str path of the rolling features file
+    """
+    logging.info("Entered the replay_machine_state method of DataTransformation class")
+    try:
+      store = MachineStateStore(self.config.machine_state_window, self.config.machine_state_max_machines)
+      readings = pd.concat([train_df, test_df], ignore_index=True)
+      rolling_df = replay_rolling_features(readings, store)
+      rolling_df.insert(0, 'id', readings['id'])
+      os.makedirs(os.path.dirname(self.config.rolling_features_file_path), exist_ok=True)
+      rolling_df.sort_values('id').to_csv(self.config.rolling_features_file_path, index=False)
+      logging.info(f"Rolling features saved to {self.config.rolling_features_file_path}")
+      return self.config.rolling_features_file_path
+    except Exception as e:
+      logging.error(f"Error in cls DataTransformation method replay_machine_state: {e}")
+      raise CustomException(e, sys)
+
   def transform_data(self) -> DataTransformationArtifact:
     logging.info("Entered the transform_data method of DataTransformation class")
     try:
@@ -78,6 +86,7 @@ class DataTransformation:
 
       train_df = read_csv(self.ingestion_artifact.train_file_path)
       test_df = read_csv(self.ingestion_artifact.test_file_path)
+      rolling_features_file_path = self.replay_machine_state(train_df, test_df)
 
       feature_train_df = train_df.drop(columns=[self.schema['target']], axis=1)
       target_train_df = train_df[self.schema['target']]
@@ -114,7 +123,8 @@ class DataTransformation:
       return DataTransformationArtifact(
         transformed_train_file_path=self.config.transformed_train_file_path,
         transformed_test_file_path=self.config.transformed_test_file_path,
-        transformed_object_file_path=self.config.transformed_object_file_path
+        transformed_object_file_path=self.config.transformed_object_file_path,
+        rolling_features_file_path=rolling_features_file_path
       )
     except Exception as e:
       logging.error(f"Error in cls DataTransformation method transform_data: {e}")
@@ -6,11 +6,12 @@ import numpy as np
 import pandas as pd
 
 from sklearn.metrics import f1_score, roc_auc_score
+from machine_failure.entity.model import MachineFailureModel
 from machine_failure.entity.s3_model import MachineFailureS3Model
-from machine_failure.utils.main_utils import drop_columns, read_yaml_file
+from machine_failure.utils.main_utils import load_object, prepare_prediction_features, read_yaml_file
 from machine_failure.logger.custom_logging import logging
 from machine_failure.exception.custom_exception import CustomException
-from machine_failure.entity.config_entity import ModelBucketConfig
+from machine_failure.entity.config_entity import ModelBucketConfig, ServingConfig
 from machine_failure.entity.artifact_entity import DataIngestionArtifact, ModelTrainerArtifact, ModelEvaluationArtifact
 
 import mlflow
@@ -21,6 +22,7 @@ params = read_yaml_file("config/param.yaml")
 class ModelEvaluation:
   def __init__(self, model_trainer_artifact: ModelTrainerArtifact, data_ingestion_artifact: DataIngestionArtifact):
     self.config = ModelBucketConfig()
+    self.serving_config = ServingConfig()
     self.model_trainer_artifact = model_trainer_artifact
     self.ingestion_artifact = data_ingestion_artifact
     self.schema = read_yaml_file(os.path.join(params["config"]["dir"], params["config"]["schema_file_path"]))
@@ -41,15 +43,60 @@ class ModelEvaluation:
       logging.error(f"Error in cls ModelEvaluation method get_bucket_model: {e}")
       raise CustomException(e, sys)
 
+  def evaluate_cascade(self, model: MachineFailureModel, X_test: pd.DataFrame, y_test: pd.Series) -> dict:
+    """
+    Compare the configured cascade with scoring every row by the full ensemble
+    return: dict of the AUC and F1 of both, their loss, the fraction of rows escalated and the
+            band around 0.5 that would escalate serving.cascade.max_escalated_fraction of them
+    """
+    logging.info('Entered the evaluate_cascade method of ModelEvaluation class')
+    try:
+      first_stage, (low, high) = self.serving_config.cascade_first_stage, self.serving_config.cascade_band
+      labels, proba = model.predict_with_proba(X_test)
+      first_stage_proba = model.trained_model_object.named_estimators_[first_stage].predict_proba(model.transform(X_test))[:, 1]
+      model.use_cascade(first_stage, (low, high))
+      try:
+        cascade_labels, cascade_proba = model.predict_with_proba(X_test)
+      finally:
+        model.use_cascade(None)
+
+      report = {
+        "roc_auc": roc_auc_score(y_test, proba[:, 1]),
+        "f1_score": f1_score(y_test, labels),
+        "cascade_roc_auc": roc_auc_score(y_test, cascade_proba[:, 1]),
+        "cascade_f1_score": f1_score(y_test, cascade_labels),
+        "escalated_fraction": float(np.mean((first_stage_proba >= low) & (first_stage_proba <= high))),
+      }
+      report["roc_auc_loss"] = report["roc_auc"] - report["cascade_roc_auc"]
+      report["f1_loss"] = report["f1_score"] - report["cascade_f1_score"]
+      # the rows closest to the decision threshold are the ones worth escalating
+      max_escalated = self.serving_config.cascade_max_escalated_fraction
+      half_width = float(np.quantile(np.abs(first_stage_proba - 0.5), max_escalated))
+      report["suggested_band_low"], report["suggested_band_high"] = 0.5 - half_width, 0.5 + half_width
+      if report["escalated_fraction"] > max_escalated:
+        logging.warning(f"Cascade band [{low}, {high}] escalates {report['escalated_fraction']:.1%} of the rows, "
+                        f"[{0.5 - half_width:.3f}, {0.5 + half_width:.3f}] would escalate {max_escalated:.0%}")
+      logging.info(f"Cascade with first stage {first_stage} and band [{low}, {high}]: {report}")
+      return report
+    except Exception as e:
+      logging.error(f"Error in cls ModelEvaluation method evaluate_cascade: {e}")
+      raise CustomException(e, sys)
+
   def evaluate_model(self) -> ModelEvaluationArtifact:
     logging.info('Entered the evaluate_model method of ModelEvaluation class')
     try:
       test_df = pd.read_csv(self.ingestion_artifact.test_file_path)
-      X_test = test_df.drop(columns=[self.schema['target']], axis=1)
       y_test = test_df[self.schema['target']]
-      X_test['Product ID'] = X_test['Product ID'].str.replace('M','').str.replace('L','').str.replace('H','').astype(int)
-      X_test = drop_columns(X_test, self.schema['drop_columns'])
+      X_test = prepare_prediction_features(test_df, self.schema)
       logging.info('Model evaluation started')
+      cascade_report = None
+      # evaluated whether or not serving runs the cascade, the report is what decides to turn it on
+      if self.serving_config.cascade_first_stage:
+        try:
+          cascade_report = self.evaluate_cascade(load_object(self.model_trainer_artifact.trained_model_file_path), X_test, y_test)
+        except CustomException as e:
+          # the trained model is still evaluated and pushed
+          logging.warning(f"Cascade evaluation failed, check serving.cascade: {e}")
 
       logging.info('Getting the model from the bucket')
       model = self.get_bucket_model()
@@ -63,6 +110,9 @@ class ModelEvaluation:
 
           mlflow.log_metric("roc_auc", roc_auc)
           mlflow.log_metric("f1_score", f1)
+          mlflow.log_metrics({f"trained_{name}": value for name, value in (cascade_report or {}).items()})
+          mlflow.log_metrics({f"training_{stage}_seconds": seconds
+                              for stage, seconds in (self.model_trainer_artifact.stage_seconds or {}).items()})
           if tracking_url_type != "file":
             mlflow.sklearn.log_model(model.loaded_model.trained_model_object, "model", registered_model_name="ml_model")
           else:
@@ -74,7 +124,8 @@ class ModelEvaluation:
       is_model_accepted = self.model_trainer_artifact.metric_artifact.roc_auc_score > roc_auc
       logging.info('Exiting the evaluate_model method of ModelEvaluation class. Model evaluation completed')
       return ModelEvaluationArtifact(model_accepted=is_model_accepted, s3_model_path=self.config.s3_model_key_path, 
-                                     trained_model_path=self.model_trainer_artifact.trained_model_file_path)
+                                     trained_model_path=self.model_trainer_artifact.trained_model_file_path,
+                                     cascade_report=cascade_report)
     except Exception as e:
       logging.error(f"Error in cls ModelEvaluation method evaluate_model: {e}")
       raise CustomException(e, sys)
\ No newline at end of file
@@ -1,10 +1,18 @@
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
 from importlib import import_module
+import argparse
+import hashlib
+import json
+import multiprocessing
 import os
 import sys
-from typing import Any, Dict, Tuple
+import time
+from typing import Any, Dict, List, Optional, Tuple
 import numpy as np
 
 from machine_failure.entity.model import MachineFailureModel
+from machine_failure.entity.training_datasets import TrainingDatasets
 from machine_failure.exception.custom_exception import CustomException
 from machine_failure.logger.custom_logging import logging
 from machine_failure.utils.main_utils import load_numpy_array_data, read_yaml_file, load_object, save_object
@@ -14,17 +22,264 @@ from machine_failure.entity.artifact_entity import DataTransformationArtifact, M
 from imblearn.over_sampling import SMOTE
 from sklearn.metrics import confusion_matrix, roc_auc_score, f1_score
 from sklearn.ensemble import VotingClassifier
+from sklearn.preprocessing import LabelEncoder
+from sklearn.utils import Bunch
 import optuna
+from optuna.trial import FrozenTrial, TrialState
 
 params = read_yaml_file("config/param.yaml")
 
+StorageSpec = Tuple[Optional[str], Optional[str]]
+FINISHED = (TrialState.COMPLETE, TrialState.PRUNED)
+
+def make_study_storage(storage_spec: StorageSpec) -> Any:
+  """
+  Build the Optuna storage shared by every process tuning a study
+  storage_spec: (kind, path), kind journal (a lock-protected append-only file, safe on
+                filesystems shared by several hosts), sqlite, or None for in-memory
+  """
+  kind, path = storage_spec
+  if kind is None:
+    return None
+  if kind == "journal":
+    from optuna.storages.journal import JournalFileBackend
+    return optuna.storages.JournalStorage(JournalFileBackend(path))
+  if kind == "sqlite":
+    return f"sqlite:///{path}"
+  raise ValueError(f"Unknown Optuna storage: {kind}")
+
+def suggest_params(trial: optuna.Trial, search_space: Dict[str, Any]) -> Dict[str, Any]:
+  params = {}
+  for param, space in search_space.items():
+    if space["type"] == "int":
+      params[param] = trial.suggest_int(f"{param}", space["low"], space["high"])
+    elif space["type"] == "float":
+      if space.get("log", False):
+        params[param] = trial.suggest_float(f"{param}", space["low"], space["high"], log=True)
+      else:
+        params[param] = trial.suggest_float(f"{param}", space["low"], space["high"])
+    elif space["type"] == "categorical":
+      if "None" in space["choices"]:
+        choices = [None if choice == "None" else choice for choice in space["choices"]]
+        params[param] = trial.suggest_categorical(f"{param}", choices)
+      else:
+        params[param] = trial.suggest_categorical(f"{param}", space["choices"])
+  return params
+
+def make_pruner(pruner_config: Optional[Dict[str, Any]]) -> optuna.pruners.BasePruner:
+  pruner_config = pruner_config or {}
+  kind = pruner_config.get("type", "none")
+  if kind == "none":
+    return optuna.pruners.NopPruner()
+  if kind == "median":
+    return optuna.pruners.MedianPruner(n_startup_trials=pruner_config.get("n_startup_trials", 5),
+                                       n_warmup_steps=pruner_config.get("n_warmup_steps", 0))
+  if kind == "successive_halving":
+    return optuna.pruners.SuccessiveHalvingPruner(min_resource=pruner_config.get("min_resource", "auto"),
+                                                  reduction_factor=pruner_config.get("reduction_factor", 4))
+  if kind == "hyperband":
+    return optuna.pruners.HyperbandPruner(min_resource=pruner_config.get("min_resource", 1),
+                                          max_resource=pruner_config.get("max_resource", "auto"),
+                                          reduction_factor=pruner_config.get("reduction_factor", 3))
+  raise ValueError(f"Unknown Optuna pruner: {kind}")
+
+class PruningReporter:
+  """
+  Reports the validation AUC of a trial to the pruner and stops the fit once the pruner
+  rules the trial out, remembering the last step (boosting rounds or trees) reached
+  """
+  def __init__(self, trial: optuna.Trial):
+    self.trial = trial
+    self.steps = 0
+
+  def report(self, step: int, value: float) -> None:
+    self.steps = step
+    self.trial.report(value, step)
+    if self.trial.should_prune():
+      raise optuna.TrialPruned(f"Pruned at step {step} with validation AUC {value:.4f}")
+
+def run_trials_of(study: optuna.Study, run: Optional[str] = None, states: Tuple[TrialState, ...] = FINISHED) -> List[FrozenTrial]:
+  """
+  Trials of one training run in a study that persists across runs
+  run: run id, the run currently tuning the study by default
+  """
+  run = run or study.user_attrs.get("run")
+  return [trial for trial in study.get_trials(deepcopy=False, states=states) if trial.user_attrs.get("run") == run]
+
+def best_run_trial(study: optuna.Study, run: Optional[str] = None) -> Optional[FrozenTrial]:
+  """
+  Best completed trial of one training run, trials of earlier runs were scored on other data
+  """
+  completed = run_trials_of(study, run, states=(TrialState.COMPLETE,))
+  if not completed:
+    return None
+  pick = max if study.direction == optuna.study.StudyDirection.MAXIMIZE else min
+  return pick(completed, key=lambda trial: trial.value)
+
+def last_completed_run(study: optuna.Study) -> Optional[str]:
+  """
+  Most recent run of study with a completed trial. A run killed before completing any
+  trial is skipped, the run before it still has the best parameters to start from.
+  """
+  completed = [trial for trial in study.get_trials(deepcopy=False, states=(TrialState.COMPLETE,)) if trial.user_attrs.get("run")]
+  return max(completed, key=lambda trial: trial.number).user_attrs["run"] if completed else None
+
+def summarize_study(study: optuna.Study) -> Dict[str, Any]:
+  """
+  Trials run and pruned by the current run of study, with the tuning time spent and an estimate
+  of the time saved by pruning, assuming the pruned trials would have kept their time per step
+  """
+  trials = run_trials_of(study)
+  pruned = [trial for trial in trials if trial.state == TrialState.PRUNED]
+  spent = sum(trial.duration.total_seconds() for trial in trials if trial.duration is not None)
+  saved = sum(trial.duration.total_seconds() * (trial.user_attrs["planned_steps"] / trial.user_attrs["steps"] - 1)
+              for trial in pruned if trial.duration is not None and trial.user_attrs.get("steps"))
+  best_trial = best_run_trial(study)
+  return {
+    "trials": len(trials),
+    "completed": len(trials) - len(pruned),
+    "pruned": len(pruned),
+    "warm_start": study.user_attrs.get("warm_start_from") is not None,
+    "tuning_seconds": round(spent, 1),
+    "estimated_seconds_saved": round(saved, 1),
+    "best_value": best_trial.value if best_trial is not None else None,
+  }
+
+def run_trials_started_before(study: optuna.Study, trial_number: int, run: str) -> List[FrozenTrial]:
+  """
+  Trials of run numbered before trial_number that count towards its n_trials: finished or still
+  running, including running trials not yet tagged with their run
+  """
+  return [trial for trial in study.get_trials(deepcopy=False, states=FINISHED + (TrialState.RUNNING,))
+          if trial.number < trial_number and (trial.user_attrs.get("run") == run or
+                                              (trial.state == TrialState.RUNNING and "run" not in trial.user_attrs))]
+
+class RunTrialsCallback:
+  """
+  Stops the study once the current run holds n_trials finished trials, counting the trials of
+  every process tuning the study and none of the earlier runs
+  """
+  def __init__(self, n_trials: int):
+    self.n_trials = n_trials
+
+  def __call__(self, study: optuna.Study, trial: FrozenTrial) -> None:
+    if len(run_trials_of(study)) >= self.n_trials:
+      study.stop()
+
+class BestEstimatorKeeper:
+  """
+  Keeps the fitted estimator of the best trial finished in this process, dropping the one it
+  replaces, so tuning holds at most one fitted model per study beside the trial running
+  """
+  def __init__(self, direction: str):
+    self.maximize = direction == "maximize"
+    self.trial_number: Optional[int] = None
+    self.value: Optional[float] = None
+    self.estimator: Any = None
+
+  def offer(self, trial_number: int, value: float, estimator: Any) -> None:
+    if self.value is None or (value > self.value if self.maximize else value < self.value):
+      self.trial_number, self.value, self.estimator = trial_number, value, estimator
+
+def run_trials(study: optuna.Study, model_config: Dict[str, Any], optuna_config: Dict[str, Any], n_threads: Optional[int],
+               datasets: TrainingDatasets, keeper: Optional[BestEstimatorKeeper] = None) -> None:
+  """
+  Run trials of study in this process until the current run holds the n_trials planned when the
+  study was prepared, counting the trials of every other process tuning the same study, or until
+  optuna timeout seconds
+  n_threads: estimator n_jobs of each trial, None keeps the estimator default
+  keeper: optional BestEstimatorKeeper offered the fitted estimator of every completed trial
+  """
+  model_class = ModelTrainer._get_model_class(model_config)
+  fixed_params = dict(model_config["params"])
+  if n_threads is not None and "n_jobs" in model_class().get_params() and "n_jobs" not in fixed_params:
+    fixed_params["n_jobs"] = n_threads
+  pruner_config = optuna_config.get("pruner") or {}
+  pruning = pruner_config.get("type", "none") != "none"
+
+  run = study.user_attrs.get("run")
+  n_trials = study.user_attrs.get("n_trials", optuna_config["n_trials"])
+
+  def objective(trial):
+    # RunTrialsCallback stops a process only after its trial ends, a process starting a trial
+    # while the others finish the last ones would run past n_trials
+    if len(run_trials_started_before(trial.study, trial.number, run)) >= n_trials:
+      raise optuna.TrialPruned(f"Run {run} already holds its {n_trials} trials")
+    trial.set_user_attr("run", run)
+    model = model_class(**fixed_params, **suggest_params(trial, model_config["search_space"]))
+    if pruning:
+      # the trial records the steps run and planned, from which the time saved is estimated
+      reporter = PruningReporter(trial)
+      planned_steps = model.get_params()["n_estimators"]
+      trial.set_user_attr("planned_steps", planned_steps)
+      try:
+        model = datasets.fit(model, reporter.report, pruner_config.get("report_interval", 10),
+                             pruner_config.get("forest_step_trees", 50))
+      finally:
+        trial.set_user_attr("steps", reporter.steps or planned_steps)
+    else:
+      model = datasets.fit(model)
+
+    y_pred_proba = model.predict_proba(datasets.X_test)[:, 1]
+    roc_auc = roc_auc_score(datasets.y_test, y_pred_proba)
+    if keeper is not None:
+      keeper.offer(trial.number, roc_auc, model)
+    return roc_auc
+
+  timeout = optuna_config.get("timeout")
+  started_at = time.perf_counter()
+  study.optimize(objective, n_trials=n_trials, timeout=timeout, callbacks=[RunTrialsCallback(n_trials)])
+  if timeout is not None and time.perf_counter() - started_at >= timeout:
+    # kept on the study, the process reporting on the run may not be the one that timed out
+    study.set_user_attr("timed_out_run", run)
+
+def tune_worker(study_name: str, storage_spec: StorageSpec, model_config: Dict[str, Any], optuna_config: Dict[str, Any],
+                n_threads: Optional[int], X_train: np.ndarray, y_train: np.ndarray, X_test: np.ndarray,
+                y_test: np.ndarray) -> Tuple[Optional[int], Any]:
+  """
+  Entry point of a tuning process, adds trials to a study created by ModelTrainer
+  return: (trial number, fitted estimator) of the best trial this process ran
+  """
+  try:
+    study = optuna.load_study(study_name=study_name, storage=make_study_storage(storage_spec),
+                              sampler=optuna.samplers.TPESampler(), pruner=make_pruner(optuna_config.get("pruner")))
+    keeper = BestEstimatorKeeper(optuna_config["direction"])
+    run_trials(study, model_config, optuna_config, n_threads, TrainingDatasets(X_train, y_train, X_test, y_test), keeper)
+    return keeper.trial_number, keeper.estimator
+  except Exception as e:
+    logging.error(f"Error in tune_worker for study {study_name}: {e}")
+    raise CustomException(e, sys)
+
+def prefit_voting_classifier(estimators: List[Tuple[str, Any]], voting: str, weights: Optional[List[float]],
+                             y: np.ndarray) -> VotingClassifier:
+  """
+  Assemble a VotingClassifier from members that are already fitted, with the state
+  VotingClassifier.fit would have left without fitting clones of them again
+  y: training labels the members were fitted on
+  """
+  voting_clf = VotingClassifier(estimators=estimators, voting=voting, weights=weights)
+  voting_clf.le_ = LabelEncoder().fit(y)
+  voting_clf.classes_ = voting_clf.le_.classes_
+  voting_clf.estimators_ = [estimator for _, estimator in estimators]
+  voting_clf.named_estimators_ = Bunch(**dict(estimators))
+  return voting_clf
+
 class ModelTrainer:
   def __init__(self, data_transformation_artifact: DataTransformationArtifact):
     self.config = ModelTrainerConfig()
     self.transformation_artifact = data_transformation_artifact
     self.model_schema = read_yaml_file(os.path.join(params["config"]["dir"], params["config"]["model_trainer_config_file_path"]))
+    data_schema = read_yaml_file(os.path.join(params["config"]["dir"], params["config"]["schema_file_path"]))
+    # studies continue only while the data schema they were tuned on stays the same
+    self.schema_version = hashlib.sha256(json.dumps(data_schema, sort_keys=True, default=str).encode()).hexdigest()[:8]
+    self.run = time.strftime("%Y%m%dT%H%M%S")
+    self.tuning_summary: Dict[str, Dict[str, Any]] = {}
+    # fitted estimators of the best trials, filled while tuning in this process or returned by the tuning processes
+    self.best_estimators: Dict[str, Any] = {}
+    self.stage_seconds: Dict[str, float] = {}
 
-  def _get_model_class(self, model_config: Dict[str, Any]) -> Any:
+  @staticmethod
+  def _get_model_class(model_config: Dict[str, Any]) -> Any:
     logging.info("Entered the _get_model_class method of ModelTrainer class")
     try:
       module_name = model_config["module"]
@@ -37,68 +292,237 @@ class ModelTrainer:
       logging.error(f"Error in cls ModelTrainer method _get_model_class: {e}")
       raise CustomException(e, sys)
     
-  def _optimize_model(self, model_name: str, model_config: Dict[str, Any], X_train: np.ndarray, y_train: np.ndarray, X_test: np.ndarray, y_test: np.ndarray) -> Dict[str, Any]:
+  def _study_name(self, model_name: str) -> str:
+    return f"{self.model_schema['optuna']['study_name']}_{model_name}_{self.schema_version}"
+
+  def _warm_start(self) -> Dict[str, Any]:
+    warm_start = self.model_schema["optuna"].get("warm_start") or {}
+    return warm_start if warm_start.get("enabled", False) else {}
+
+  def _storage_spec(self) -> StorageSpec:
+    optuna_config = self.model_schema["optuna"]
+    if not optuna_config.get("parallel", {}).get("enabled", False) and not self._warm_start():
+      return None, None
+    kind = optuna_config.get("storage", "journal")
+    os.makedirs(self.config.optuna_storage_dir, exist_ok=True)
+    file_name = "studies.db" if kind == "sqlite" else "studies.log"
+    return kind, os.path.join(self.config.optuna_storage_dir, file_name)
+
+  def _create_study(self, model_name: str, storage_spec: StorageSpec) -> optuna.Study:
+    """
+    Create the study of model_name for this run. With warm_start, the study of an earlier run
+    on the same data schema is continued instead: the sampler and pruner learn from its trials,
+    the best trials of the last run that completed a trial are enqueued first and the run has the warm_start
+    n_trials. The run and its n_trials are kept on the study for the processes joining it.
+    """
+    storage = make_study_storage(storage_spec)
+    study_name = self._study_name(model_name)
+    warm_start = self._warm_start()
+    if storage is not None and not warm_start:
+      try:
+        # every training run tunes from scratch, trials of an earlier run would count towards n_trials
+        optuna.delete_study(study_name=study_name, storage=storage)
+      except KeyError:
+        pass
+    study = optuna.create_study(
+      direction=self.model_schema["optuna"]["direction"],
+      sampler=optuna.samplers.TPESampler(),
+      pruner=make_pruner(self.model_schema["optuna"].get("pruner")),
+      study_name=study_name,
+      storage=storage,
+      load_if_exists=bool(warm_start),
+    )
+    previous_run = last_completed_run(study)
+    previous_trials = run_trials_of(study, previous_run, states=(TrialState.COMPLETE,)) if previous_run else []
+    n_trials = self.model_schema["optuna"]["n_trials"]
+    if previous_trials:
+      n_trials = warm_start.get("n_trials", n_trials)
+      previous_trials.sort(key=lambda trial: trial.value, reverse=study.direction == optuna.study.StudyDirection.MAXIMIZE)
+      # scored again on the new data, not skipped as duplicates of the trials they come from
+      enqueued = previous_trials[:warm_start.get("enqueue_best", 1)]
+      # a run killed before starting them leaves its enqueued trials waiting, they are run now
+      waiting = {trial.user_attrs.get("enqueued_from") for trial in study.get_trials(deepcopy=False, states=(TrialState.WAITING,))}
+      for trial in enqueued:
+        if trial.number not in waiting:
+          study.enqueue_trial(trial.params, user_attrs={"enqueued_from": trial.number})
+      logging.info(f"Continuing study {study_name} after run {previous_run} with {n_trials} trials, "
+                   f"{len(enqueued)} of its best trials enqueued")
+    study.set_user_attr("warm_start_from", previous_run if previous_trials else None)
+    study.set_user_attr("run", self.run)
+    study.set_user_attr("n_trials", n_trials)
+    return study
+
+  def _plan_parallelism(self) -> Tuple[int, int, int]:
+    """
+    Split the CPU budget between tuning processes and estimator threads so that
+    processes x threads never exceeds it
+    return: (processes per study, concurrent processes, estimator threads per trial)
+    """
+    parallel = self.model_schema["optuna"].get("parallel", {})
+    cpu_budget = parallel.get("cpu_budget") or os.cpu_count()
+    n_models = len(self.model_schema["models"])
+    trial_jobs = max(1, min(parallel.get("trial_jobs", 1), cpu_budget // n_models))
+    processes = min(n_models * trial_jobs, cpu_budget)
+    return trial_jobs, processes, max(1, cpu_budget // processes)
+
+  @contextmanager
+  def _timed(self, stage: str):
+    started_at = time.perf_counter()
+    try:
+      yield
+    finally:
+      self.stage_seconds[stage] = round(self.stage_seconds.get(stage, 0.0) + time.perf_counter() - started_at, 3)
+
+  def _best_trial(self, study: optuna.Study) -> FrozenTrial:
+    best_trial = best_run_trial(study)
+    if best_trial is None:
+      raise ValueError(f"No trial of study {study.study_name} completed in run {self.run}")
+    return best_trial
+
+  def _keep_best_estimator(self, model_name: str, study: optuna.Study, trial_number: Optional[int], estimator: Any) -> None:
+    # the best trial may have run on another host joining the study, its estimator is not here
+    if estimator is not None and trial_number == self._best_trial(study).number:
+      self.best_estimators[model_name] = estimator
+
+  def _log_study(self, model_name: str, study: optuna.Study) -> None:
+    summary = summarize_study(study)
+    self.tuning_summary[model_name] = summary
+    logging.info(f"Tuning summary for model {model_name}: {summary}")
+    n_trials = study.user_attrs["n_trials"]
+    if summary["trials"] >= n_trials:
+      return
+    if study.user_attrs.get("timed_out_run") == self.run:
+      logging.warning(f"Tuning of model {model_name} stopped by the {self.model_schema['optuna']['timeout']}s timeout "
+                      f"after {summary['trials']} of {n_trials} trials")
+    else:
+      failed = len(run_trials_of(study, states=(TrialState.FAIL,)))
+      logging.warning(f"Tuning of model {model_name} finished {summary['trials']} of {n_trials} trials, "
+                      f"{failed} trials failed")
+
+  def _optimize_model(self, model_name: str, model_config: Dict[str, Any], datasets: TrainingDatasets) -> Dict[str, Any]:
     logging.info("Entered the _optimize_model method of ModelTrainer class")
     try:
-      model_class = self._get_model_class(model_config)
-      def objective(trial):
-        params = {}
-        for param, space in model_config["search_space"].items():
-          if space["type"] == "int":
-            params[param] = trial.suggest_int(f"{param}", space["low"], space["high"])
-          elif space["type"] == "float":
-            if space.get("log", False):
-              params[param] = trial.suggest_float(f"{param}", space["low"], space["high"], log=True)
-            else:
-              params[param] = trial.suggest_float(f"{param}", space["low"], space["high"])
-          elif space["type"] == "categorical":
-            if "None" in space["choices"]:
-              choices = [None if choice == "None" else choice for choice in space["choices"]]
-              params[param] = trial.suggest_categorical(f"{param}", choices)
-            else:
-              params[param] = trial.suggest_categorical(f"{param}", space["choices"])
-
-        model = model_class(**model_config["params"], **params)
-        model.fit(X_train, y_train)
-
-        y_pred_proba = model.predict_proba(X_test)[:, 1]
-        roc_auc = roc_auc_score(y_test, y_pred_proba)
-        return roc_auc
-
-      study = optuna.create_study(
-        direction=self.model_schema["optuna"]["direction"],
-        sampler=optuna.samplers.TPESampler(),
-        study_name=f"{model_name}_tuning",
-      )
-      study.optimize(objective, n_trials=self.model_schema["optuna"]["n_trials"])
-      logging.info(f"Best ROC AUC for model {model_name}: {study.best_value}")
-      logging.info(f"Best parameters for model {model_name}: {study.best_params}")
+      study = self._create_study(model_name, self._storage_spec())
+      keeper = BestEstimatorKeeper(self.model_schema["optuna"]["direction"])
+      run_trials(study, model_config, self.model_schema["optuna"], None, datasets, keeper)
+      self._keep_best_estimator(model_name, study, keeper.trial_number, keeper.estimator)
+      self._log_study(model_name, study)
+      best_trial = self._best_trial(study)
+      logging.info(f"Best ROC AUC for model {model_name}: {best_trial.value}")
+      logging.info(f"Best parameters for model {model_name}: {best_trial.params}")
       logging.info(f"Exiting the _optimize_model method of ModelTrainer class")
-      return study.best_params
+      return best_trial.params
     except Exception as e:
       logging.error(f"Error in cls ModelTrainer method _optimize_model: {e}")
       raise CustomException(e, sys)
 
+  def _optimize_models_parallel(self, datasets: TrainingDatasets) -> Dict[str, Dict[str, Any]]:
+    """
+    Tune every model at the same time, each study in trial_jobs processes sharing the study
+    through the file storage. More hosts on the same filesystem can join a study with
+    python machine_failure/components/model_trainer.py --join <model name>
+    Every process builds its own binned datasets, they cannot be shared across processes.
+    """
+    logging.info("Entered the _optimize_models_parallel method of ModelTrainer class")
+    try:
+      storage_spec = self._storage_spec()
+      trial_jobs, processes, n_threads = self._plan_parallelism()
+      logging.info(f"Tuning with {processes} processes, {trial_jobs} per study, {n_threads} estimator threads per trial")
+      for model_name in self.model_schema["models"]:
+        self._create_study(model_name, storage_spec)
+
+      # spawned rather than forked, OpenMP runtimes of xgboost and lightgbm are not fork-safe
+      with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = [
+          (model_name, pool.submit(tune_worker, self._study_name(model_name), storage_spec, model_config,
+                                   self.model_schema["optuna"], n_threads, datasets.X_train, datasets.y_train,
+                                   datasets.X_test, datasets.y_test))
+          for model_name, model_config in self.model_schema["models"].items()
+          for _ in range(trial_jobs)
+        ]
+        kept: Dict[str, List[Tuple[Optional[int], Any]]] = {model_name: [] for model_name in self.model_schema["models"]}
+        for model_name, future in futures:
+          kept[model_name].append(future.result())
+
+      best_params = {}
+      for model_name in self.model_schema["models"]:
+        study = optuna.load_study(study_name=self._study_name(model_name), storage=make_study_storage(storage_spec))
+        for trial_number, estimator in kept[model_name]:
+          self._keep_best_estimator(model_name, study, trial_number, estimator)
+        self._log_study(model_name, study)
+        best_trial = self._best_trial(study)
+        logging.info(f"Best ROC AUC for model {model_name}: {best_trial.value} after {len(run_trials_of(study))} trials")
+        logging.info(f"Best parameters for model {model_name}: {best_trial.params}")
+        best_params[model_name] = best_trial.params
+      logging.info("Exiting the _optimize_models_parallel method of ModelTrainer class")
+      return best_params
+    except Exception as e:
+      logging.error(f"Error in cls ModelTrainer method _optimize_models_parallel: {e}")
+      raise CustomException(e, sys)
+
+  def join_study(self, model_name: str) -> None:
+    """
+    Add trials to a study being tuned by another host sharing the artifact directory
+    """
+    logging.info("Entered the join_study method of ModelTrainer class")
+    try:
+      storage_spec = self._storage_spec()
+      if storage_spec[0] is None:
+        raise CustomException("Joining a study needs a file storage, enable optuna.parallel or optuna.warm_start", sys)
+      train_arr = load_numpy_array_data(self.transformation_artifact.transformed_train_file_path)
+      test_arr = load_numpy_array_data(self.transformation_artifact.transformed_test_file_path)
+      _, _, n_threads = self._plan_parallelism()
+      tune_worker(self._study_name(model_name), storage_spec, self.model_schema["models"][model_name],
+                  self.model_schema["optuna"], n_threads,
+                  train_arr[:, :-1], train_arr[:, -1], test_arr[:, :-1], test_arr[:, -1])
+      logging.info("Exiting the join_study method of ModelTrainer class")
+    except Exception as e:
+      logging.error(f"Error in cls ModelTrainer method join_study: {e}")
+      raise CustomException(e, sys)
+
   def train_model(self, X_train: np.ndarray, y_train: np.ndarray, X_test: np.ndarray, y_test: np.ndarray) -> Tuple[object, ClassificationMetricArtifact]:
     logging.info("Entered the train_model method of ModelTrainer class")
     try:
-      # Optimize each model individually
-      best_models = {}
-      for model_name, model_config in self.model_schema["models"].items():
-        logging.info(f"Optimizing model: {model_name}")
-        best_params = self._optimize_model(model_name, model_config, X_train, y_train, X_test, y_test)
+      self.best_estimators = {}
+      datasets = TrainingDatasets(X_train, y_train, X_test, y_test)
+      with self._timed("tuning"):
+        if self.model_schema["optuna"].get("parallel", {}).get("enabled", False):
+          tuned_params = self._optimize_models_parallel(datasets)
+        else:
+          # Optimize each model individually
+          tuned_params = {}
+          for model_name, model_config in self.model_schema["models"].items():
+            logging.info(f"Optimizing model: {model_name}")
+            tuned_params[model_name] = self._optimize_model(model_name, model_config, datasets)
 
-        model_class = self._get_model_class(model_config)
-        best_models[model_name] = model_class(**model_config["params"], **best_params)
+      best_models = {}
+      with self._timed("final_fit"):
+        for model_name, model_config in self.model_schema["models"].items():
+          model = self.best_estimators.pop(model_name, None)
+          if model is None:
+            logging.info(f"Fitting {model_name} with the best parameters, its best trial ran on another host")
+            model_class = self._get_model_class(model_config)
+            # the final fit reuses the binned datasets of the trials run in this process
+            model = datasets.fit(model_class(**model_config["params"], **tuned_params[model_name]))
+          elif "n_jobs" in model.get_params():
+            # tuning processes may have capped the threads, serving decides its own
+            n_jobs = model_config["params"].get("n_jobs")
+            model.set_params(n_jobs=n_jobs)
+            if hasattr(model, "get_booster"):
+              # XGBoost does not pass a None n_jobs on, its booster would keep the tuning nthread
+              model.get_booster().set_param({"nthread": n_jobs or 0})
+          best_models[model_name] = model
 
       # Create VotingClassifier with the best models
       logging.info("Creating VotingClassifier")
-      voting_clf = VotingClassifier(
-        estimators=[(name, model) for name, model in best_models.items()],
-        voting=self.model_schema["voting_classifier"]["params"]["voting"],
-        weights=self.model_schema["voting_classifier"]["params"]["weights"]
-      )
-      voting_clf.fit(X_train, y_train)
+      with self._timed("ensemble"):
+        voting_clf = prefit_voting_classifier(
+          estimators=list(best_models.items()),
+          voting=self.model_schema["voting_classifier"]["params"]["voting"],
+          weights=self.model_schema["voting_classifier"]["params"]["weights"],
+          y=y_train
+        )
+      logging.info(f"Training stage seconds: {self.stage_seconds}")
 
       y_pred_proba = voting_clf.predict_proba(X_test)[:, 1]
       y_pred = voting_clf.predict(X_test)
@@ -143,17 +567,25 @@ class ModelTrainer:
       logging.info("Exiting the get_model method of ModelTrainer class")
       return ModelTrainerArtifact(
         trained_model_file_path=self.config.trained_model_file_path,
-        metric_artifact=metric_artifact
+        metric_artifact=metric_artifact,
+        tuning_summary=self.tuning_summary,
+        stage_seconds=self.stage_seconds
       )
     except Exception as e:
       logging.error(f"Error in cls ModelTrainer method get_model: {e}")
       raise CustomException(e, sys)
 
 if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Train the voting classifier")
+  parser.add_argument('--join', metavar='MODEL', help="Add trials to the running study of MODEL instead of training")
+  args = parser.parse_args()
   transformation_artifact = DataTransformationArtifact(
     'artifact/data_transformation/preprocessor.pkl',
     'artifact/data_transformation/data/train.npy',
     'artifact/data_transformation/data/test.npy'
   )
   model_trainer = ModelTrainer(transformation_artifact)
-  model_artifact = model_trainer.get_model()
\ No newline at end of file
+  if args.join:
+    model_trainer.join_study(args.join)
+  else:
+    model_artifact = model_trainer.get_model()
\ No newline at end of file
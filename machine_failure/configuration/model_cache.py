@@ -0,0 +1,91 @@
+import hashlib
+import os
+import pickle
+import sys
+import tempfile
+from typing import Optional, Tuple
+
+from machine_failure.exception.custom_exception import CustomException
+from machine_failure.logger.custom_logging import logging
+
+class LocalModelCache:
+  """
+  Class Name  : LocalModelCache
+  Description : Keeps downloaded model pickles on local disk under
+                <cache_dir>/<hash of bucket and key>/<etag>.pkl. Files are written atomically
+                so several processes can share the directory, and the least recently used
+                versions are evicted once the directory grows beyond max_size_bytes.
+  Output      : unpickled model
+  On Failure  : Raise Exception
+  """
+  def __init__(self, cache_dir: str, max_size_bytes: int):
+    self.cache_dir = cache_dir
+    self.max_size_bytes = max_size_bytes
+
+  def _key_dir(self, bucket_name: str, s3_key: str) -> str:
+    digest = hashlib.sha1(f"{bucket_name}/{s3_key}".encode()).hexdigest()
+    return os.path.join(self.cache_dir, digest)
+
+  def _path(self, bucket_name: str, s3_key: str, etag: str) -> str:
+    return os.path.join(self._key_dir(bucket_name, s3_key), f"{etag}.pkl")
+
+  def get(self, bucket_name: str, s3_key: str, etag: str) -> Optional[object]:
+    path = self._path(bucket_name, s3_key, etag)
+    if not os.path.exists(path):
+      return None
+    logging.info(f"Model cache hit for {bucket_name}/{s3_key} version {etag}")
+    return self._load(path)
+
+  def get_latest(self, bucket_name: str, s3_key: str) -> Optional[Tuple[object, str]]:
+    key_dir = self._key_dir(bucket_name, s3_key)
+    if not os.path.isdir(key_dir):
+      return None
+    files = [os.path.join(key_dir, name) for name in os.listdir(key_dir) if name.endswith(".pkl")]
+    if not files:
+      return None
+    path = max(files, key=os.path.getmtime)
+    etag = os.path.basename(path)[:-len(".pkl")]
+    logging.info(f"Using cached model {bucket_name}/{s3_key} version {etag}")
+    return self._load(path), etag
+
+  def put(self, bucket_name: str, s3_key: str, etag: str, content: bytes) -> None:
+    logging.info("Entered the put method of LocalModelCache class")
+    try:
+      path = self._path(bucket_name, s3_key, etag)
+      os.makedirs(os.path.dirname(path), exist_ok=True)
+      file_descriptor, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+      with os.fdopen(file_descriptor, "wb") as file_obj:
+        file_obj.write(content)
+      os.replace(tmp_path, path)
+      self.evict(keep=path)
+      logging.info("Exiting the put method of LocalModelCache class")
+    except Exception as e:
+      logging.error(f"Error in cls LocalModelCache method put: {e}")
+      raise CustomException(e, sys)
+
+  def evict(self, keep: Optional[str] = None) -> None:
+    entries = []
+    for root, _, names in os.walk(self.cache_dir):
+      for name in names:
+        if name.endswith(".pkl"):
+          path = os.path.join(root, name)
+          stat = os.stat(path)
+          entries.append((stat.st_mtime, stat.st_size, path))
+    total_size = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+      if total_size <= self.max_size_bytes:
+        break
+      if path == keep:
+        continue
+      logging.info(f"Evicting cached model {path}")
+      try:
+        os.remove(path)
+      except FileNotFoundError:
+        pass
+      total_size -= size
+
+  def _load(self, path: str) -> object:
+    # the modification time doubles as the last access time for LRU eviction
+    os.utime(path)
+    with open(path, "rb") as file_obj:
+      return pickle.load(file_obj)
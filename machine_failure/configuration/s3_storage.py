@@ -2,7 +2,7 @@ import boto3
 import os
 import sys
 from io import StringIO
-from typing import Union, List
+from typing import Union, List, Tuple
 from mypy_boto3_s3.service_resource import Bucket
 from botocore.exceptions import ClientError
 import pandas as pd
@@ -85,6 +85,27 @@ class S3Storage:
       logging.error(f"Error in cls S3Storage method load_model: {e}")
       raise CustomException(e, sys)
 
+  def get_object_version(self, s3_key: str, bucket_name: str) -> str:
+    logging.info("Entered the get_object_version method of S3Storage class")
+    try:
+      response = self.s3_client.head_object(Bucket=bucket_name, Key=s3_key)
+      logging.info("Exiting the get_object_version method of S3Storage class")
+      return response["ETag"].strip('"')
+    except Exception as e:
+      logging.error(f"Error in cls S3Storage method get_object_version: {e}")
+      raise CustomException(e, sys)
+
+  def download_object(self, s3_key: str, bucket_name: str) -> Tuple[bytes, str]:
+    logging.info("Entered the download_object method of S3Storage class")
+    try:
+      response = self.s3_client.get_object(Bucket=bucket_name, Key=s3_key)
+      content = response["Body"].read()
+      logging.info("Exiting the download_object method of S3Storage class")
+      return content, response["ETag"].strip('"')
+    except Exception as e:
+      logging.error(f"Error in cls S3Storage method download_object: {e}")
+      raise CustomException(e, sys)
+
   def create_folder(self, folder_name: str, bucket_name: str) -> None:
     logging.info("Entered the create_folder method of S3Storage class")
     try:
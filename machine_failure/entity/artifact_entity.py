@@ -1,4 +1,5 @@
 from dataclasses import dataclass
+from typing import Optional
 @dataclass
 class DataIngestionArtifact:
   train_file_path:str 
@@ -15,6 +16,7 @@ class DataTransformationArtifact:
   transformed_object_file_path:str 
   transformed_train_file_path:str
   transformed_test_file_path:str
+  rolling_features_file_path: Optional[str] = None
 
 @dataclass
 class ClassificationMetricArtifact:
@@ -25,12 +27,15 @@ class ClassificationMetricArtifact:
 class ModelTrainerArtifact:
   trained_model_file_path:str 
   metric_artifact:ClassificationMetricArtifact
+  tuning_summary: Optional[dict] = None
+  stage_seconds: Optional[dict] = None
 
 @dataclass
 class ModelEvaluationArtifact:
   model_accepted:bool
   s3_model_path:str 
   trained_model_path:str
+  cascade_report:Optional[dict] = None
 
 @dataclass
 class ModelPusherArtifact:
@@ -0,0 +1,46 @@
+from typing import Any, Optional
+import numpy as np
+from sklearn.base import BaseEstimator, ClassifierMixin
+from sklearn.utils.validation import check_is_fitted
+
+class LightGBMBoosterClassifier(ClassifierMixin, BaseEstimator):
+  """
+  Class Name  : LightGBMBoosterClassifier
+  Description : Classifier around a LightGBM Booster trained with lightgbm.train, for boosters
+                LGBMClassifier cannot be built from. fit only records the classes the booster
+                was trained on, the booster itself is never retrained. Exposes booster_ and
+                best_iteration_ like LGBMClassifier, and n_jobs sets the prediction threads.
+  Output      : class probabilities and labels predicted by the booster
+  """
+  def __init__(self, booster: Any = None, n_jobs: Optional[int] = None):
+    self.booster = booster
+    self.n_jobs = n_jobs
+
+  def fit(self, X: np.ndarray, y: np.ndarray) -> "LightGBMBoosterClassifier":
+    if self.booster is None:
+      raise ValueError("LightGBMBoosterClassifier needs a trained booster")
+    if X.shape[1] != self.booster.num_feature():
+      raise ValueError(f"X has {X.shape[1]} features, the booster was trained on {self.booster.num_feature()}")
+    self.classes_ = np.unique(y)
+    self.n_features_in_ = X.shape[1]
+    return self
+
+  @property
+  def booster_(self) -> Any:
+    return self.booster
+
+  @property
+  def best_iteration_(self) -> int:
+    return self.booster.best_iteration
+
+  def predict_proba(self, X: np.ndarray) -> np.ndarray:
+    check_is_fitted(self, "classes_")
+    # num_threads 0 is the OpenMP default, overriding the threads the booster was trained with
+    proba = self.booster.predict(X, num_iteration=self.booster.best_iteration or None,
+                                 num_threads=self.n_jobs if self.n_jobs is not None else 0)
+    if proba.ndim == 1:
+      return np.column_stack([1.0 - proba, proba])
+    return proba
+
+  def predict(self, X: np.ndarray) -> np.ndarray:
+    return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
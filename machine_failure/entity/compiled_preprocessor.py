@@ -0,0 +1,127 @@
+import sys
+from typing import Dict, Sequence, Tuple
+import numpy as np
+import pandas as pd
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OrdinalEncoder, StandardScaler
+
+from machine_failure.exception.custom_exception import CustomException
+from machine_failure.logger.custom_logging import logging
+
+# raw numeric inputs in the column order expected by transform_arrays
+RAW_NUMERIC_COLUMNS = ['Product ID', 'Air temperature [K]', 'Process temperature [K]', 'Rotational speed [rpm]',
+                       'Torque [Nm]', 'Tool wear [min]', 'TWF', 'HDF', 'PWF', 'OSF']
+DERIVED_COLUMNS = ['Power', 'Temp Ratio', 'Torque X Tool wear', 'Tool Wear Rate']
+CATEGORICAL_COLUMN = 'Type'
+
+def _scaler_params(scaler: StandardScaler, width: int) -> Tuple[np.ndarray, np.ndarray]:
+  mean = scaler.mean_ if scaler.with_mean else np.zeros(width)
+  scale = scaler.scale_ if scaler.with_std else np.ones(width)
+  return np.asarray(mean, dtype=np.float64), np.asarray(scale, dtype=np.float64)
+
+class CompiledPreprocessor:
+  """
+  Class Name  : CompiledPreprocessor
+  Description : Flat NumPy version of the fitted FeatureGenerator + ColumnTransformer
+                pipeline. The scaler means, scales and the ordinal category mapping are
+                extracted once, so a request is transformed with a handful of array
+                operations instead of a DataFrame copy and the sklearn transformers.
+  Output      : np.ndarray with the same columns as preprocessing_object.transform
+  On Failure  : Raise Exception, e.g. for a pipeline layout it does not know how to compile
+  """
+  def __init__(self, preprocessing_object: Pipeline, dtype: str = "float64"):
+    try:
+      self.dtype = np.dtype(dtype)
+      column_transformer = preprocessing_object.named_steps['preprocessor']
+      feature_columns = RAW_NUMERIC_COLUMNS + DERIVED_COLUMNS
+      means, scales, indices = [], [], []
+      self.category_values: Dict[str, float] = {}
+      self.category_position = None
+      position = 0
+      for name, transformer, columns in column_transformer.transformers_:
+        if transformer == 'drop' or len(columns) == 0:
+          continue
+        steps = [step for _, step in transformer.steps] if isinstance(transformer, Pipeline) else [transformer]
+        if len(steps) == 1 and isinstance(steps[0], StandardScaler) and all(col in feature_columns for col in columns):
+          mean, scale = _scaler_params(steps[0], len(columns))
+          means.append(mean)
+          scales.append(scale)
+          indices.extend(feature_columns.index(col) for col in columns)
+          position += len(columns)
+        elif isinstance(steps[0], OrdinalEncoder) and list(columns) == [CATEGORICAL_COLUMN] and \
+             all(isinstance(step, StandardScaler) for step in steps[1:]) and self.category_position is None:
+          codes = np.arange(len(steps[0].categories_[0]), dtype=np.float64)
+          for scaler in steps[1:]:
+            mean, scale = _scaler_params(scaler, 1)
+            codes = (codes - mean[0]) / scale[0]
+          self.category_values = dict(zip(steps[0].categories_[0], codes))
+          self.category_position = position
+          position += 1
+        else:
+          raise ValueError(f"Cannot compile transformer {name} on columns {list(columns)}")
+      if self.category_position is None:
+        raise ValueError(f"Pipeline has no encoder for the {CATEGORICAL_COLUMN} column")
+
+      self.feature_index = np.asarray(indices)
+      self.mean = np.concatenate(means).astype(self.dtype)
+      self.scale = np.concatenate(scales).astype(self.dtype)
+      self.n_features = position
+      # None for generators that were never fitted, the batch maximum is used then
+      self.max_tool_wear = getattr(preprocessing_object.named_steps['feature_generator'], 'max_tool_wear_', None)
+      self.numeric_positions = np.delete(np.arange(position), self.category_position)
+    except Exception as e:
+      logging.error(f"Error in cls CompiledPreprocessor method __init__: {e}")
+      raise CustomException(e, sys)
+
+  def transform_arrays(self, numeric: np.ndarray, types: Sequence[str]) -> np.ndarray:
+    """
+    numeric: array of shape (n, 10) holding RAW_NUMERIC_COLUMNS
+    types: sequence of n machine types
+    """
+    x = np.asarray(numeric, dtype=self.dtype).reshape(-1, len(RAW_NUMERIC_COLUMNS))
+    air, process, speed, torque, wear = x[:, 1], x[:, 2], x[:, 3], x[:, 4], x[:, 5]
+    # same semantics as FeatureGenerator.transform
+    features = np.empty((x.shape[0], len(RAW_NUMERIC_COLUMNS) + len(DERIVED_COLUMNS)), dtype=self.dtype)
+    features[:, :len(RAW_NUMERIC_COLUMNS)] = x
+    features[:, 10] = torque * speed
+    features[:, 11] = process / air
+    features[:, 12] = torque * wear
+    with np.errstate(divide='ignore', invalid='ignore'):
+      # pandas yields NaN for a zero maximum without warning, so does this
+      features[:, 13] = wear / (wear.max() if self.max_tool_wear is None else self.dtype.type(self.max_tool_wear))
+
+    out = np.empty((x.shape[0], self.n_features), dtype=self.dtype)
+    out[:, self.numeric_positions] = (features[:, self.feature_index] - self.mean) / self.scale
+    try:
+      out[:, self.category_position] = [self.category_values[value] for value in types]
+    except KeyError as e:
+      raise ValueError(f"Found unknown categories [{e.args[0]}] in column {CATEGORICAL_COLUMN}")
+    return out
+
+  def transform(self, dataframe: pd.DataFrame) -> np.ndarray:
+    return self.transform_arrays(dataframe[RAW_NUMERIC_COLUMNS].to_numpy(dtype=self.dtype),
+                                 dataframe[CATEGORICAL_COLUMN].tolist())
+
+  def make_sample(self, n_rows: int = 256, seed: int = 0) -> pd.DataFrame:
+    """
+    Draw inputs around the fitted scaler statistics, used to check the compiled path
+    """
+    rng = np.random.default_rng(seed)
+    sample = {}
+    for position, column in enumerate(RAW_NUMERIC_COLUMNS):
+      matches = np.flatnonzero(self.feature_index == position)
+      mean, scale = (float(self.mean[matches[0]]), float(self.scale[matches[0]])) if len(matches) else (0.0, 1.0)
+      sample[column] = rng.normal(mean, scale, n_rows)
+    sample[CATEGORICAL_COLUMN] = rng.choice(list(self.category_values), n_rows)
+    return pd.DataFrame(sample)
+
+  def verify(self, preprocessing_object: Pipeline, dataframe: pd.DataFrame, rtol: float = 1e-4, atol: float = 1e-4) -> float:
+    """
+    Compare the compiled output with the sklearn pipeline and return the largest absolute difference
+    """
+    expected = preprocessing_object.transform(dataframe)
+    actual = self.transform(dataframe)
+    max_error = float(np.max(np.abs(expected - actual)))
+    if not np.allclose(expected, actual, rtol=rtol, atol=atol):
+      raise CustomException(f"Compiled preprocessor differs from the sklearn pipeline, max abs error {max_error}", sys)
+    return max_error
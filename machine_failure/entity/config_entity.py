@@ -1,6 +1,7 @@
 import os
 from machine_failure.utils.main_utils import read_yaml_file
 from dataclasses import dataclass
+from typing import Optional
 
 params = read_yaml_file("config/param.yaml")
 
@@ -25,6 +26,9 @@ class DataTransformationConfig:
   transformed_train_file_path: str = os.path.join(data_transformation_dir, params["data_transformation"]["data_dir_name"], params["artifact"]["train_file_name"].replace("csv", "npy"))
   transformed_test_file_path: str = os.path.join(data_transformation_dir, params["data_transformation"]["data_dir_name"], params["artifact"]["test_file_name"].replace("csv", "npy"))
   transformed_object_file_path: str = os.path.join(data_transformation_dir, params["artifact"]["preprocessor_file_name"])
+  rolling_features_file_path: str = os.path.join(data_transformation_dir, params["data_transformation"]["data_dir_name"], params["data_transformation"]["rolling_features_file_name"])
+  machine_state_window: int = params["machine_state"]["window"]
+  machine_state_max_machines: int = params["machine_state"]["max_machines"]
 
 @dataclass
 class ModelTrainerConfig:
@@ -32,8 +36,59 @@ class ModelTrainerConfig:
   trained_model_file_path: str = os.path.join(model_trainer_dir, params["artifact"]["model_file_name"])
   expected_metric: float = params["model_trainer"]["expected_roc_score"]
   model_config_file_path: str = params["config"]["model_trainer_config_file_path"]
+  optuna_storage_dir: str = os.path.join(model_trainer_dir, params["model_trainer"]["optuna_dir_name"])
 
 @dataclass
 class ModelBucketConfig:
   bucket_name: str = params["cloud"]["model_bucket_name"]
-  s3_model_key_path: str = params["artifact"]["model_file_name"]
\ No newline at end of file
+  s3_model_key_path: str = params["artifact"]["model_file_name"]
+
+@dataclass
+class ModelCacheConfig:
+  enabled: bool = params["model_cache"]["enabled"]
+  cache_dir: str = params["model_cache"]["dir"]
+  max_size_bytes: int = params["model_cache"]["max_size_mb"] * 1024 * 1024
+
+@dataclass
+class ServingConfig:
+  max_batch_size: int = params["serving"]["max_batch_size"]
+  micro_batch_enabled: bool = params["serving"]["micro_batch"]["enabled"]
+  micro_batch_max_size: int = params["serving"]["micro_batch"]["max_batch_size"]
+  micro_batch_max_wait_ms: float = params["serving"]["micro_batch"]["max_wait_ms"]
+  executor_kind: str = params["serving"]["executor"]["kind"]
+  executor_max_workers: int = params["serving"]["executor"]["max_workers"]
+  warm_up_enabled: bool = params["serving"]["warm_up"]["enabled"]
+  warm_up_batch_size: int = params["serving"]["warm_up"]["batch_size"]
+  hot_reload_enabled: bool = params["serving"]["hot_reload"]["enabled"]
+  hot_reload_poll_interval_seconds: float = params["serving"]["hot_reload"]["poll_interval_seconds"]
+  preprocessing_mode: str = params["serving"]["preprocessing"]["mode"]
+  preprocessing_dtype: str = params["serving"]["preprocessing"]["dtype"]
+  inference_backend: str = params["serving"]["inference_backend"]["name"]
+  compact_max_rows: int = params["serving"]["inference_backend"]["compact_max_rows"]
+  prediction_cache_enabled: bool = params["serving"]["prediction_cache"]["enabled"]
+  prediction_cache_max_entries: int = params["serving"]["prediction_cache"]["max_entries"]
+  prediction_cache_ttl_seconds: float = params["serving"]["prediction_cache"]["ttl_seconds"]
+  prediction_cache_resolution: tuple = tuple((params["serving"]["prediction_cache"]["resolution"] or {}).items())
+  stage_timing_enabled: bool = params["serving"]["stage_timing"]["enabled"]
+  admission_enabled: bool = params["serving"]["admission"]["enabled"]
+  admission_max_in_flight: int = params["serving"]["admission"]["max_in_flight"]
+  admission_batch_max_in_flight: int = params["serving"]["admission"]["batch_max_in_flight"]
+  admission_max_queue: int = params["serving"]["admission"]["max_queue"]
+  single_deadline_ms: float = params["serving"]["admission"]["default_deadline_ms"]["single"]
+  batch_deadline_ms: float = params["serving"]["admission"]["default_deadline_ms"]["batch"]
+  prefork_workers: int = params["serving"]["prefork"]["workers"]
+  # a pickled model on the local disk served instead of the S3 one, for benchmarks and local runs
+  local_model_path: Optional[str] = os.getenv("LOCAL_MODEL_PATH")
+  cascade_enabled: bool = params["serving"]["cascade"]["enabled"]
+  cascade_first_stage: str = params["serving"]["cascade"]["first_stage"]
+  cascade_band: tuple = tuple(params["serving"]["cascade"]["band"])
+  cascade_max_escalated_fraction: float = params["serving"]["cascade"]["max_escalated_fraction"]
+  parallel_members_enabled: bool = params["serving"]["parallel_members"]["enabled"]
+  # 0 is a budget of its own, it runs the members one after another
+  parallel_members_cpu_budget: int = (os.cpu_count() if params["serving"]["parallel_members"]["cpu_budget"] is None
+                                      else params["serving"]["parallel_members"]["cpu_budget"])
+  stream_max_buffered: int = params["serving"]["stream"]["max_buffered"]
+  stream_max_batch: int = params["serving"]["stream"]["max_batch"]
+  stream_overflow: str = params["serving"]["stream"]["overflow"]
+  machine_state_window: int = params["machine_state"]["window"]
+  machine_state_max_machines: int = params["machine_state"]["max_machines"]
@@ -0,0 +1,49 @@
+import sys
+from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.pipeline import Pipeline
+
+from machine_failure.exception.custom_exception import CustomException
+from machine_failure.logger.custom_logging import logging
+
+class FeatureGenerator(BaseEstimator, TransformerMixin):
+  def fit(self, X, y=None):
+    # learned once so that transform does not depend on how rows are batched
+    self.max_tool_wear_ = float(X['Tool wear [min]'].max())
+    return self
+
+  def transform(self, X):
+    data = X.copy()
+    # Create new features
+    data['Power'] = data['Torque [Nm]'] * data['Rotational speed [rpm]']
+    data['Temp Ratio'] = data['Process temperature [K]'] / data['Air temperature [K]']
+    data['Torque X Tool wear'] = data['Torque [Nm]'] * data['Tool wear [min]']
+    max_tool_wear = getattr(self, 'max_tool_wear_', None)
+    if max_tool_wear is None:
+      # generators pickled before max_tool_wear_ existed, see migrate_feature_generator
+      max_tool_wear = data['Tool wear [min]'].max()
+    data['Tool Wear Rate'] = data['Tool wear [min]'] / max_tool_wear
+    return data
+
+def migrate_feature_generator(preprocessor: Pipeline) -> bool:
+  """
+  Give a FeatureGenerator pickled before max_tool_wear_ existed its fit-time statistic.
+  The generator was applied to the whole training set when the scaler was fitted, so
+  the scaler means satisfy mean(Tool Wear Rate) = mean(Tool wear [min]) / max_tool_wear.
+  preprocessor: Pipeline saved by DataTransformation
+  return: bool True when the generator was migrated
+  """
+  try:
+    feature_generator = preprocessor.named_steps['feature_generator']
+    if getattr(feature_generator, 'max_tool_wear_', None) is not None:
+      return False
+    column_transformer = preprocessor.named_steps['preprocessor']
+    scaler = column_transformer.named_transformers_['num'].named_steps['scaler']
+    columns = list(next(cols for name, _, cols in column_transformer.transformers_ if name == 'num'))
+    mean_tool_wear = scaler.mean_[columns.index('Tool wear [min]')]
+    mean_tool_wear_rate = scaler.mean_[columns.index('Tool Wear Rate')]
+    feature_generator.max_tool_wear_ = float(mean_tool_wear / mean_tool_wear_rate)
+    logging.info(f"Migrated FeatureGenerator, recovered max_tool_wear_={feature_generator.max_tool_wear_}")
+    return True
+  except Exception as e:
+    logging.error(f"Error in migrate_feature_generator: {e}")
+    raise CustomException(e, sys)
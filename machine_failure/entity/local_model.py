@@ -0,0 +1,40 @@
+import os
+import threading
+from typing import Optional, Tuple
+
+from machine_failure.entity.model import MachineFailureModel
+from machine_failure.entity.s3_model import MachineFailureS3Model
+from machine_failure.logger.custom_logging import logging
+from machine_failure.utils.main_utils import load_object
+
+class MachineFailureLocalModel(MachineFailureS3Model):
+  """
+  Class Name  : MachineFailureLocalModel
+  Description : File-backed stand-in for MachineFailureS3Model, serves a pickled model from
+                the local disk without AWS credentials. The version is derived from the file
+                modification time and size, so replacing the file is picked up by hot reload
+                like a new S3 object. Used by benchmarks and local runs (LOCAL_MODEL_PATH).
+  """
+  def __init__(self, model_file_path: str):
+    self.bucket_name = None
+    self.s3 = None
+    self.cache = None
+    self.model_path = model_file_path
+    self.loaded_model: MachineFailureModel = None
+    self.model_version: Optional[str] = None
+    self._load_lock = threading.Lock()
+    logging.info(f"Serving the local model {model_file_path} instead of S3")
+
+  def is_model_present(self, model_path):
+    return os.path.exists(model_path)
+
+  def _load_model_version(self) -> Tuple[MachineFailureModel, str]:
+    version = self.get_remote_version()
+    return load_object(self.model_path), version
+
+  def reset_connection(self) -> None:
+    pass
+
+  def get_remote_version(self) -> str:
+    stat = os.stat(self.model_path)
+    return f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
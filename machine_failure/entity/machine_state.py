@@ -0,0 +1,99 @@
+import sys
+from array import array
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+import pandas as pd
+
+from machine_failure.exception.custom_exception import CustomException
+from machine_failure.logger.custom_logging import logging
+
+ROLLING_FEATURES = ['Tool Wear Change', 'Torque Moving Average', 'Rotational Speed Moving Average']
+
+class MachineState:
+  """
+  Last window readings of one machine in fixed-size ring buffers, with running sums so that
+  an update and its moving averages cost O(1) whatever the window
+  """
+  __slots__ = ('count', 'head', 'tool_wear', 'torque', 'speed', 'torque_sum', 'speed_sum')
+
+  def __init__(self, window: int):
+    self.count = 0
+    self.head = 0
+    self.tool_wear = array('d', bytes(8 * window))
+    self.torque = array('d', bytes(8 * window))
+    self.speed = array('d', bytes(8 * window))
+    self.torque_sum = 0.0
+    self.speed_sum = 0.0
+
+  def update(self, tool_wear: float, torque: float, speed: float) -> Tuple[float, float, float]:
+    window = len(self.tool_wear)
+    if self.count == window:
+      # the slot at head holds the oldest reading, it leaves the window
+      self.torque_sum -= self.torque[self.head]
+      self.speed_sum -= self.speed[self.head]
+    else:
+      self.count += 1
+    self.tool_wear[self.head] = tool_wear
+    self.torque[self.head] = torque
+    self.speed[self.head] = speed
+    self.torque_sum += torque
+    self.speed_sum += speed
+    self.head = (self.head + 1) % window
+    oldest = self.head if self.count == window else 0
+    # tool wear gained per reading across the window, 0 for the first reading of a machine
+    tool_wear_change = (tool_wear - self.tool_wear[oldest]) / (self.count - 1) if self.count > 1 else 0.0
+    return tool_wear_change, self.torque_sum / self.count, self.speed_sum / self.count
+
+class MachineStateStore:
+  """
+  Class Name  : MachineStateStore
+  Description : Rolling state of every machine keyed by Product ID. Memory is bounded by
+                max_machines records of three window-sized ring buffers each, the machine
+                idle for the longest time is evicted when a new one arrives at a full store.
+                The same store computes the rolling features when serving streamed readings
+                and when DataTransformation replays the training data, so both match.
+  Output      : ROLLING_FEATURES values of the reading just added
+  """
+  def __init__(self, window: int, max_machines: int):
+    if window < 1 or max_machines < 1:
+      raise ValueError(f"window and max_machines must be positive, got {window} and {max_machines}")
+    self.window = window
+    self.max_machines = max_machines
+    self.machines: "OrderedDict[int, MachineState]" = OrderedDict()
+    self.evictions = 0
+
+  def __len__(self) -> int:
+    return len(self.machines)
+
+  def update(self, product_id: int, tool_wear: float, torque: float, speed: float) -> Tuple[float, float, float]:
+    state = self.machines.get(product_id)
+    if state is None:
+      if len(self.machines) >= self.max_machines:
+        self.machines.popitem(last=False)
+        self.evictions += 1
+      state = self.machines[product_id] = MachineState(self.window)
+    else:
+      self.machines.move_to_end(product_id)
+    return state.update(tool_wear, torque, speed)
+
+  def features(self, product_id: int, tool_wear: float, torque: float, speed: float) -> Dict[str, float]:
+    return dict(zip(ROLLING_FEATURES, self.update(product_id, tool_wear, torque, speed)))
+
+def replay_rolling_features(df: pd.DataFrame, store: MachineStateStore, order_column: Optional[str] = 'id') -> pd.DataFrame:
+  """
+  Feed readings through store in the order they were taken and return their rolling features
+  df: DataFrame with the schema.yaml columns, Product ID as the dataset value (M14860) or as int
+  order_column: column giving the reading order, None to keep the row order
+  return: DataFrame of ROLLING_FEATURES with the index of df
+  """
+  try:
+    ordered = df.sort_values(order_column, kind='stable') if order_column is not None else df
+    product_ids = ordered['Product ID'].astype(str).str.lstrip('LMH').astype(int)
+    rows = [store.update(product_id, tool_wear, torque, speed) for product_id, tool_wear, torque, speed in zip(
+      product_ids, ordered['Tool wear [min]'], ordered['Torque [Nm]'], ordered['Rotational speed [rpm]'])]
+    features = pd.DataFrame(rows, columns=ROLLING_FEATURES, index=ordered.index)
+    logging.info(f"Replayed {len(rows)} readings of {len(store)} machines, {store.evictions} evicted")
+    return features.loc[df.index]
+  except Exception as e:
+    logging.error(f"Error in replay_rolling_features: {e}")
+    raise CustomException(e, sys)
@@ -1,37 +1,294 @@
+import copy
+import os
 import sys
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, List, Optional, Sequence, Tuple
+import numpy as np
 import pandas as pd
 from sklearn.pipeline import Pipeline
+from machine_failure.entity.feature_generator import migrate_feature_generator
+from machine_failure.entity.compiled_preprocessor import CATEGORICAL_COLUMN, RAW_NUMERIC_COLUMNS, CompiledPreprocessor
+from machine_failure.entity.tree_ensemble import CompactTreeEnsemble
 from machine_failure.logger.custom_logging import logging
 from machine_failure.exception.custom_exception import CustomException
+from machine_failure.serving.metrics import registry, stage_timer
+
+# one pool for the voting members of every model in the process, so concurrent requests and
+# reloaded models share the same threads instead of each adding their own
+_member_pool: Optional[ThreadPoolExecutor] = None
+_member_pool_size = 0
+_member_pool_lock = threading.Lock()
+
+def _submit_members(calls: List[Tuple[Any, ...]]) -> List[Future]:
+  """
+  Submit (function, *args) calls to the shared member pool, grown to a thread per call
+  """
+  global _member_pool, _member_pool_size
+  with _member_pool_lock:
+    if _member_pool is None or _member_pool_size < len(calls):
+      if _member_pool is not None:
+        # members already submitted to the old pool still finish, its threads exit after them
+        _member_pool.shutdown(wait=False)
+      _member_pool = ThreadPoolExecutor(max_workers=len(calls), thread_name_prefix="voting-member")
+      _member_pool_size = len(calls)
+    # submitted under the lock, a pool replaced in between would refuse them
+    return [_member_pool.submit(*call) for call in calls]
+
+def _reset_member_pool() -> None:
+  # threads do not survive a fork, a forked worker starts its own pool
+  global _member_pool, _member_pool_size, _member_pool_lock
+  _member_pool, _member_pool_size, _member_pool_lock = None, 0, threading.Lock()
+
+os.register_at_fork(after_in_child=_reset_member_pool)
 
 class MachineFailureModel:
   def __init__(self, preprocessing_object: Pipeline, trained_model_object: object):
     self.preprocessing_object = preprocessing_object
     self.trained_model_object = trained_model_object
 
+  def __getstate__(self):
+    # the thread-capped member copies are serving state, a pickle keeps only the fitted members
+    state = self.__dict__.copy()
+    state.pop("parallel_estimators", None)
+    state.pop("parallel_members", None)
+    return state
+
+  def __setstate__(self, state):
+    self.__dict__.update(state)
+    # models pushed before FeatureGenerator learned its statistics in fit are migrated on load
+    try:
+      migrate_feature_generator(self.preprocessing_object)
+    except Exception as e:
+      logging.warning(f"FeatureGenerator not migrated, Tool Wear Rate stays batch dependent: {e}")
+
+  def compile(self, dtype: str = "float64") -> float:
+    """
+    Switch preprocessing to the NumPy fast path after checking it against the sklearn pipeline.
+    Returns the largest absolute difference seen during the check.
+    """
+    logging.info("Entered compile method of MachineFailureModel class")
+    try:
+      compiled = CompiledPreprocessor(self.preprocessing_object, dtype)
+      max_error = compiled.verify(self.preprocessing_object, compiled.make_sample())
+      self.compiled_preprocessor = compiled
+      logging.info(f"Exiting the compile method of MachineFailureModel class, max abs error {max_error}")
+      return max_error
+    except Exception as e:
+      logging.error(f"Error in cls MachineFailureModel method compile: {e}")
+      raise CustomException(e, sys)
+
+  def use_backend(self, backend: str, max_rows: int = 64, atol: float = 1e-5) -> float:
+    """
+    Select the inference backend: "sklearn" runs the fitted VotingClassifier, "compact" evaluates
+    batches of up to max_rows rows with the flattened CompactTreeEnsemble (larger batches stay on
+    the native libraries, which are faster there). The compact ensemble is checked against
+    predict_proba first; returns the largest absolute difference seen.
+    """
+    logging.info("Entered use_backend method of MachineFailureModel class")
+    try:
+      if backend == "sklearn":
+        self.compact_ensemble = None
+        return 0.0
+      if backend != "compact":
+        raise ValueError(f"Unknown inference backend: {backend}")
+      ensemble = CompactTreeEnsemble(self.trained_model_object)
+      # the preprocessed features are standardized, so a normal sample covers the split thresholds
+      sample = np.random.default_rng(0).normal(size=(512, self.trained_model_object.n_features_in_))
+      max_error = float(np.max(np.abs(ensemble.predict_proba(sample) - self.trained_model_object.predict_proba(sample))))
+      if max_error > atol:
+        raise ValueError(f"Compact ensemble differs from predict_proba, max abs error {max_error}")
+      self.compact_ensemble = ensemble
+      self.compact_max_rows = max_rows
+      logging.info(f"Exiting the use_backend method of MachineFailureModel class, max abs error {max_error}")
+      return max_error
+    except Exception as e:
+      logging.error(f"Error in cls MachineFailureModel method use_backend: {e}")
+      raise CustomException(e, sys)
+
+  def use_cascade(self, first_stage: Optional[str], band: Tuple[float, float] = (0.2, 0.8)) -> None:
+    """
+    Score every row with the first_stage member of the VotingClassifier alone and send only the
+    rows whose failure probability falls inside band to the full ensemble. Batches small enough
+    for the compact ensemble skip the cascade. None switches back to scoring every row with the
+    ensemble.
+    """
+    logging.info("Entered use_cascade method of MachineFailureModel class")
+    try:
+      if first_stage is None:
+        self.cascade = None
+        return
+      if getattr(self.trained_model_object, "voting", None) != "soft":
+        raise ValueError("A cascade needs a soft VotingClassifier")
+      low, high = band
+      if not 0.0 <= low <= high <= 1.0:
+        raise ValueError(f"Invalid uncertainty band {band}")
+      self.cascade = (first_stage, self.trained_model_object.named_estimators_[first_stage], float(low), float(high))
+      logging.info(f"Exiting the use_cascade method of MachineFailureModel class, first stage {first_stage}, band {band}")
+    except Exception as e:
+      logging.error(f"Error in cls MachineFailureModel method use_cascade: {e}")
+      raise CustomException(e, sys)
+
+  def _proba(self, transformed_feature: np.ndarray) -> np.ndarray:
+    cascade = getattr(self, "cascade", None)
+    # small batches on the compact ensemble are cheaper than a native call of the first stage
+    if cascade is None or (getattr(self, "compact_ensemble", None) is not None and
+                           len(transformed_feature) <= self.compact_max_rows):
+      return self._ensemble_proba(transformed_feature)
+    name, first_stage, low, high = cascade
+    with stage_timer.time("estimator", estimator=name):
+      proba = first_stage.predict_proba(transformed_feature)
+    escalate = (proba[:, 1] >= low) & (proba[:, 1] <= high)
+    n_escalated = int(escalate.sum())
+    registry.counter("cascade_rows_total", "Rows scored by the cascade", labels={"stage": "first"}).inc(len(proba) - n_escalated)
+    registry.counter("cascade_rows_total", "Rows scored by the cascade", labels={"stage": "ensemble"}).inc(n_escalated)
+    if n_escalated:
+      proba[escalate] = self._ensemble_proba(transformed_feature[escalate])
+    return proba
+
+  def _ensemble_proba(self, transformed_feature: np.ndarray) -> np.ndarray:
+    ensemble = getattr(self, "compact_ensemble", None)
+    if ensemble is not None and len(transformed_feature) <= self.compact_max_rows:
+      with stage_timer.time("ensemble", backend="compact"):
+        return ensemble.predict_proba(transformed_feature)
+    parallel = getattr(self, "parallel_members", False)
+    if parallel or (stage_timer.enabled and getattr(self.trained_model_object, "voting", None) == "soft"):
+      return self._voting_proba(transformed_feature, parallel)
+    with stage_timer.time("ensemble", backend="sklearn"):
+      return self.trained_model_object.predict_proba(transformed_feature)
+
+  def _member_proba(self, name: str, estimator: object, transformed_feature: np.ndarray) -> np.ndarray:
+    with stage_timer.time("estimator", estimator=name):
+      return estimator.predict_proba(transformed_feature)
+
+  def _voting_proba(self, transformed_feature: np.ndarray, parallel: bool = False) -> np.ndarray:
+    # same average as VotingClassifier.predict_proba, computed from one transformed matrix
+    # with every member timed on its own and, when parallel, all members running at once
+    voting_classifier = self.trained_model_object
+    names = [name for name, estimator in voting_classifier.estimators if estimator != 'drop']
+    weights = voting_classifier.weights
+    if weights is not None:
+      weights = [weight for (_, estimator), weight in zip(voting_classifier.estimators, weights) if estimator != 'drop']
+    with stage_timer.time("ensemble", backend="parallel" if parallel else "sklearn"):
+      if not parallel:
+        probas = [self._member_proba(name, estimator, transformed_feature)
+                  for name, estimator in zip(names, voting_classifier.estimators_)]
+      else:
+        futures = _submit_members([(self._member_proba, name, estimator, transformed_feature)
+                                   for name, estimator in zip(names, self.parallel_estimators)])
+        probas = [future.result() for future in futures]
+      return np.average(np.asarray(probas), axis=0, weights=weights)
+
+  def use_parallel_members(self, cpu_budget: Optional[int]) -> None:
+    """
+    Run the predict_proba of the VotingClassifier members concurrently for batches that are not
+    served by the compact ensemble. The members run as copies whose n_jobs are set so that
+    together they use about cpu_budget threads, the fitted members (also the cascade first
+    stage) keep theirs. None or 0 switches back to sequential members.
+    """
+    logging.info("Entered use_parallel_members method of MachineFailureModel class")
+    try:
+      self.parallel_members = False
+      self.parallel_estimators = None
+      if not cpu_budget:
+        return
+      if getattr(self.trained_model_object, "voting", None) != "soft":
+        raise ValueError("Parallel members need a soft VotingClassifier")
+      estimators = self.trained_model_object.estimators_
+      threads_per_member = max(1, cpu_budget // len(estimators))
+      parallel_estimators = []
+      for estimator in estimators:
+        if "n_jobs" in estimator.get_params():
+          # deep, XGBoost writes n_jobs through to the booster it would share with the original
+          estimator = copy.deepcopy(estimator)
+          estimator.set_params(n_jobs=threads_per_member)
+        parallel_estimators.append(estimator)
+      self.parallel_estimators = parallel_estimators
+      self.parallel_members = True
+      logging.info(f"Exiting the use_parallel_members method of MachineFailureModel class, "
+                   f"{len(estimators)} members with {threads_per_member} threads each")
+    except Exception as e:
+      logging.error(f"Error in cls MachineFailureModel method use_parallel_members: {e}")
+      raise CustomException(e, sys)
+
+  def transform(self, dataframe: pd.DataFrame) -> np.ndarray:
+    # models unpickled from older releases have no compiled_preprocessor attribute
+    compiled = getattr(self, "compiled_preprocessor", None)
+    if compiled is not None:
+      with stage_timer.time("transform", preprocessing="compiled"):
+        return compiled.transform(dataframe)
+    with stage_timer.time("transform", preprocessing="sklearn"):
+      return self.preprocessing_object.transform(dataframe)
+
   def predict(self, dataframe: pd.DataFrame) -> pd.DataFrame:
     logging.info("Entered predict method of MachineFailureModel class")
     try:
-      transformed_feature = self.preprocessing_object.transform(dataframe)
+      transformed_feature = self.transform(dataframe)
       logging.info("Exiting the predict method of MachineFailureModel class")
-      return self.trained_model_object.predict(transformed_feature)
+      if getattr(self.trained_model_object, "voting", "soft") != "soft":
+        with stage_timer.time("ensemble", backend="sklearn"):
+          return self.trained_model_object.predict(transformed_feature)
+      return self._predict_transformed(transformed_feature)[0]
     except Exception as e:
       logging.error(f"Error in cls MachineFailureModel method predict: {e}")
       raise CustomException(e, sys)
-    
+
   def predict_proba(self, dataframe: pd.DataFrame) -> pd.DataFrame:
     logging.info("Entered predict_proba method of MachineFailureModel class")
     try:
-      transformed_feature = self.preprocessing_object.transform(dataframe)
+      transformed_feature = self.transform(dataframe)
       logging.info("Exiting the predict_proba method of MachineFailureModel class")
-      return self.trained_model_object.predict_proba(transformed_feature)
+      return self._proba(transformed_feature)
     except Exception as e:
       logging.error(f"Error in cls MachineFailureModel method predict_proba: {e}")
       raise CustomException(e, sys)
 
+  def _predict_transformed(self, transformed_feature: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    proba = self._proba(transformed_feature)
+    # soft voting predicts the argmax of the averaged probabilities, so the labels
+    # can be derived without running the ensemble a second time
+    if getattr(self.trained_model_object, "voting", "soft") == "soft":
+      labels = self.trained_model_object.classes_.take(np.argmax(proba, axis=1))
+    else:
+      with stage_timer.time("ensemble", backend="sklearn"):
+        labels = self.trained_model_object.predict(transformed_feature)
+    return labels, proba
+
+  def predict_with_proba(self, dataframe: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+    logging.info("Entered predict_with_proba method of MachineFailureModel class")
+    try:
+      labels, proba = self._predict_transformed(self.transform(dataframe))
+      logging.info("Exiting the predict_with_proba method of MachineFailureModel class")
+      return labels, proba
+    except Exception as e:
+      logging.error(f"Error in cls MachineFailureModel method predict_with_proba: {e}")
+      raise CustomException(e, sys)
+
+  def predict_with_proba_arrays(self, numeric: np.ndarray, types: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Score readings given as a (n, 10) array of RAW_NUMERIC_COLUMNS plus their machine types,
+    without building a DataFrame when the model is compiled.
+    """
+    logging.info("Entered predict_with_proba_arrays method of MachineFailureModel class")
+    try:
+      compiled = getattr(self, "compiled_preprocessor", None)
+      if compiled is not None:
+        with stage_timer.time("transform", preprocessing="compiled"):
+          transformed_feature = compiled.transform_arrays(numeric, types)
+      else:
+        dataframe = pd.DataFrame(np.asarray(numeric).reshape(-1, len(RAW_NUMERIC_COLUMNS)), columns=RAW_NUMERIC_COLUMNS)
+        dataframe[CATEGORICAL_COLUMN] = list(types)
+        with stage_timer.time("transform", preprocessing="sklearn"):
+          transformed_feature = self.preprocessing_object.transform(dataframe)
+      labels, proba = self._predict_transformed(transformed_feature)
+      logging.info("Exiting the predict_with_proba_arrays method of MachineFailureModel class")
+      return labels, proba
+    except Exception as e:
+      logging.error(f"Error in cls MachineFailureModel method predict_with_proba_arrays: {e}")
+      raise CustomException(e, sys)
+
   def __repr__(self):
     return f"{type(self.trained_model_object).__name__}()"
 
   def __str__(self):
     return f"{type(self.trained_model_object).__name__}()"
-    
\ No newline at end of file
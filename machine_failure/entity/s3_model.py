@@ -1,10 +1,18 @@
+import pickle
 import sys
+import threading
+from typing import Optional, Sequence, Tuple
+import numpy as np
 import pandas as pd
 
+from machine_failure.configuration.aws_connection import AWSConnection
+from machine_failure.configuration.model_cache import LocalModelCache
 from machine_failure.configuration.s3_storage import S3Storage
+from machine_failure.entity.config_entity import ModelCacheConfig
 from machine_failure.exception.custom_exception import CustomException
 from machine_failure.logger.custom_logging import logging
 from machine_failure.entity.model import MachineFailureModel
+from machine_failure.serving.metrics import stage_timer
 
 class MachineFailureS3Model:
   def __init__(self, bucket_name:str, model_path:str):
@@ -12,6 +20,10 @@ class MachineFailureS3Model:
     self.s3 = S3Storage()
     self.model_path = model_path
     self.loaded_model: MachineFailureModel = None
+    self.model_version: Optional[str] = None
+    self._load_lock = threading.Lock()
+    cache_config = ModelCacheConfig()
+    self.cache = LocalModelCache(cache_config.cache_dir, cache_config.max_size_bytes) if cache_config.enabled else None
 
   def is_model_present(self, model_path):
     try:
@@ -21,22 +33,82 @@ class MachineFailureS3Model:
       return False
 
   def load_model(self) -> MachineFailureModel:
-    return self.s3.load_model(self.model_path, bucket_name=self.bucket_name)
+    return self.load_model_version()[0]
+
+  def load_model_version(self) -> Tuple[MachineFailureModel, str]:
+    with stage_timer.time("model_load"):
+      return self._load_model_version()
+
+  def _load_model_version(self) -> Tuple[MachineFailureModel, str]:
+    if self.cache is None:
+      version = self.get_remote_version()
+      return self.s3.load_model(self.model_path, bucket_name=self.bucket_name), version
+    try:
+      # a HEAD request is enough to validate the local copy
+      version = self.get_remote_version()
+      model = self.cache.get(self.bucket_name, self.model_path, version)
+      if model is None:
+        content, version = self.s3.download_object(self.model_path, self.bucket_name)
+        self.cache.put(self.bucket_name, self.model_path, version, content)
+        model = pickle.loads(content)
+      return model, version
+    except Exception as e:
+      cached = self.cache.get_latest(self.bucket_name, self.model_path)
+      if cached is None:
+        raise
+      logging.warning(f"Could not fetch model from S3, serving the cached copy instead: {e}")
+      return cached
+
+  def reset_connection(self) -> None:
+    # boto3 clients and their pooled sockets must not be shared with a forked process
+    AWSConnection.client = None
+    AWSConnection.resource = None
+    self.s3 = S3Storage()
+
+  def get_remote_version(self) -> str:
+    return self.s3.get_object_version(self.model_path, self.bucket_name)
+
+  def swap_model(self, model: MachineFailureModel, version: Optional[str]) -> None:
+    # a single reference assignment, requests that already hold the old model finish on it
+    self.loaded_model = model
+    self.model_version = version
+    logging.info(f"Serving model version {version}")
+
+  def get_model(self) -> MachineFailureModel:
+    if self.loaded_model is None:
+      with self._load_lock:
+        if self.loaded_model is None:
+          self.swap_model(*self.load_model_version())
+    return self.loaded_model
+
+  def _served_model(self) -> MachineFailureModel:
+    with stage_timer.time("get_model"):
+      return self.get_model()
 
   def predict(self,df: pd.DataFrame):
     try:
-      if self.loaded_model is None:
-        self.loaded_model = self.load_model()
-      return self.loaded_model.predict(df)
+      return self._served_model().predict(df)
     except Exception as e:
       logging.error(f"Error in cls MachineFailureS3Model method predict: {e}")
       raise CustomException(e, sys)
-    
+
   def predict_proba(self,df: pd.DataFrame):
     try:
-      if self.loaded_model is None:
-        self.loaded_model = self.load_model()
-      return self.loaded_model.predict_proba(df)
+      return self._served_model().predict_proba(df)
     except Exception as e:
       logging.error(f"Error in cls MachineFailureS3Model method predict_proba: {e}")
+      raise CustomException(e, sys)
+
+  def predict_with_proba(self,df: pd.DataFrame):
+    try:
+      return self._served_model().predict_with_proba(df)
+    except Exception as e:
+      logging.error(f"Error in cls MachineFailureS3Model method predict_with_proba: {e}")
+      raise CustomException(e, sys)
+
+  def predict_with_proba_arrays(self, numeric: np.ndarray, types: Sequence[str]):
+    try:
+      return self._served_model().predict_with_proba_arrays(numeric, types)
+    except Exception as e:
+      logging.error(f"Error in cls MachineFailureS3Model method predict_with_proba_arrays: {e}")
       raise CustomException(e, sys)
\ No newline at end of file
@@ -0,0 +1,114 @@
+from typing import Any, Callable, Dict, Optional, Tuple
+import numpy as np
+from sklearn.metrics import roc_auc_score
+
+from machine_failure.entity.booster_classifier import LightGBMBoosterClassifier
+
+StepCallback = Callable[[int, float], None]
+
+class TrainingDatasets:
+  """
+  Class Name  : TrainingDatasets
+  Description : Training and validation arrays of one training run. The XGBoost QuantileDMatrix
+                and LightGBM Dataset are built on first use and shared by every later fit in
+                the process, so the training matrix is sketched and binned once instead of once
+                per trial. Boosters are trained natively on them. XGBoost boosters are loaded
+                back into the sklearn estimator they were configured from, LightGBM boosters
+                are wrapped in a LightGBMBoosterClassifier.
+  Output      : fitted sklearn-compatible estimator
+  """
+  def __init__(self, X_train: np.ndarray, y_train: np.ndarray, X_test: np.ndarray, y_test: np.ndarray):
+    self.X_train = X_train
+    self.y_train = y_train
+    self.X_test = X_test
+    self.y_test = y_test
+    self._xgboost: Optional[Tuple[Any, Any]] = None
+    self._lightgbm: Optional[Tuple[Any, Any]] = None
+
+  def xgboost(self) -> Tuple[Any, Any]:
+    if self._xgboost is None:
+      import xgboost
+      train = xgboost.QuantileDMatrix(self.X_train, self.y_train)
+      # the validation matrix reuses the training quantiles
+      self._xgboost = train, xgboost.QuantileDMatrix(self.X_test, self.y_test, ref=train)
+    return self._xgboost
+
+  def lightgbm(self) -> Tuple[Any, Any]:
+    if self._lightgbm is None:
+      import lightgbm
+      # free_raw_data=False keeps the arrays so the bins survive parameter changes between trials
+      train = lightgbm.Dataset(self.X_train, self.y_train, free_raw_data=False, params={"verbosity": -1})
+      self._lightgbm = train, lightgbm.Dataset(self.X_test, self.y_test, reference=train, free_raw_data=False)
+    return self._lightgbm
+
+  def fit(self, model: Any, on_step: Optional[StepCallback] = None, report_interval: int = 10, forest_step_trees: int = 50) -> Any:
+    """
+    Fit model on the shared datasets
+    on_step: optional callable(step, validation AUC) called every report_interval boosting
+             rounds, or every forest_step_trees trees for forests that support warm_start.
+             It may raise to stop the fit.
+    return: the fitted estimator
+    """
+    module = type(model).__module__
+    if module.startswith("xgboost") and not callable(model.objective):
+      return self._fit_xgboost(model, on_step, report_interval)
+    if module.startswith("lightgbm") and model.class_weight is None and not callable(model.objective):
+      return self._fit_lightgbm(model, on_step, report_interval)
+    if on_step is not None and "warm_start" in model.get_params():
+      return self._fit_forest(model, on_step, forest_step_trees)
+    return model.fit(self.X_train, self.y_train)
+
+  def _fit_xgboost(self, model: Any, on_step: Optional[StepCallback], report_interval: int) -> Any:
+    import xgboost
+
+    train, validation = self.xgboost()
+    params = {key: value for key, value in model.get_xgb_params().items() if value is not None}
+    callbacks = []
+    if on_step is not None:
+      class StepReporter(xgboost.callback.TrainingCallback):
+        def after_iteration(self, booster, epoch, evals_log):
+          if (epoch + 1) % report_interval == 0:
+            metrics = evals_log["validation_0"]
+            on_step(epoch + 1, metrics["auc"][-1] if "auc" in metrics else list(metrics.values())[-1][-1])
+          return False
+      callbacks.append(StepReporter())
+    booster = xgboost.train(params, train, num_boost_round=model.n_estimators,
+                            evals=[(validation, "validation_0")] if on_step is not None else (),
+                            callbacks=callbacks, verbose_eval=False)
+    model.load_model(booster.save_raw("ubj"))
+    return model
+
+  def _fit_lightgbm(self, model: Any, on_step: Optional[StepCallback], report_interval: int) -> Any:
+    import lightgbm
+
+    train, validation = self.lightgbm()
+    excluded = ("n_estimators", "importance_type", "class_weight")
+    params: Dict[str, Any] = {key: value for key, value in model.get_params().items()
+                              if value is not None and key not in excluded}
+    params.setdefault("objective", "binary" if len(np.unique(self.y_train)) <= 2 else "multiclass")
+    callbacks = []
+    if on_step is not None:
+      def step_reporter(env):
+        if (env.iteration + 1) % report_interval:
+          return
+        for _, metric, value, _ in env.evaluation_result_list:
+          if metric == "auc":
+            on_step(env.iteration + 1, value)
+      callbacks.append(step_reporter)
+    booster = lightgbm.train(params, train, num_boost_round=model.n_estimators,
+                             valid_sets=[validation] if on_step is not None else None, callbacks=callbacks)
+    # LGBMClassifier has no public way to take a booster trained outside its fit
+    return LightGBMBoosterClassifier(booster, n_jobs=model.n_jobs).fit(self.X_train, self.y_train)
+
+  def _fit_forest(self, model: Any, on_step: StepCallback, step_trees: int) -> Any:
+    n_estimators = model.get_params()["n_estimators"]
+    model.set_params(warm_start=True)
+    # every trial reports at the same tree counts whatever its n_estimators, pruners only
+    # compare trials at the same step
+    for grown in list(range(step_trees, n_estimators, step_trees)) + [n_estimators]:
+      model.set_params(n_estimators=grown)
+      model.fit(self.X_train, self.y_train)
+      if grown % step_trees == 0:
+        on_step(grown, roc_auc_score(self.y_test, model.predict_proba(self.X_test)[:, 1]))
+    model.set_params(warm_start=False)
+    return model
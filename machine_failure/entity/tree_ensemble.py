@@ -0,0 +1,211 @@
+import json
+import sys
+from typing import Any, Dict, List, Tuple
+import numpy as np
+
+from machine_failure.entity.booster_classifier import LightGBMBoosterClassifier
+from machine_failure.exception.custom_exception import CustomException
+from machine_failure.logger.custom_logging import logging
+
+LIGHTGBM_ZERO_THRESHOLD = 1e-35
+
+def _sigmoid(x: np.ndarray) -> np.ndarray:
+  return 1.0 / (1.0 + np.exp(-x))
+
+class _TreeBuilder:
+  """
+  Accumulates nodes of many trees into flat lists. Every node goes left when
+  x <= threshold, NaN follows missing_left and, for LightGBM zero-as-missing splits,
+  zero follows missing_left as well. Leaves point to themselves.
+  """
+  def __init__(self):
+    self.feature: List[int] = []
+    self.threshold: List[float] = []
+    self.left: List[int] = []
+    self.right: List[int] = []
+    self.missing_left: List[bool] = []
+    self.zero_missing: List[bool] = []
+    self.is_leaf: List[bool] = []
+    self.value: List[float] = []
+    self.float32_input: List[bool] = []
+    self.roots: List[int] = []
+
+  def add_node(self, feature: int = 0, threshold: float = 0.0, missing_left: bool = False, zero_missing: bool = False,
+               leaf_value: float = None, float32_input: bool = True) -> int:
+    index = len(self.feature)
+    is_leaf = leaf_value is not None
+    self.feature.append(feature)
+    self.threshold.append(threshold)
+    self.left.append(index)
+    self.right.append(index)
+    self.missing_left.append(missing_left)
+    self.zero_missing.append(zero_missing)
+    self.is_leaf.append(is_leaf)
+    self.value.append(leaf_value if is_leaf else 0.0)
+    self.float32_input.append(float32_input)
+    return index
+
+  def add_xgboost(self, model: Any) -> Tuple[int, float]:
+    booster = model.get_booster()
+    learner = json.loads(booster.save_raw("json"))["learner"]
+    if learner["gradient_booster"]["name"] != "gbtree" or learner["objective"]["name"] != "binary:logistic":
+      raise ValueError("Only gbtree boosters with the binary:logistic objective can be flattened")
+    trees = learner["gradient_booster"]["model"]["trees"]
+    best_iteration = getattr(model, "best_iteration", None)
+    if best_iteration is not None:
+      trees = trees[:(best_iteration + 1) * int(learner["gradient_booster"]["model"]["gbtree_model_param"]["num_parallel_tree"])]
+    for tree in trees:
+      if any(tree["split_type"]):
+        raise ValueError("Categorical XGBoost splits are not supported")
+      offset = len(self.feature)
+      for node, left in enumerate(tree["left_children"]):
+        condition = np.float32(tree["split_conditions"][node])
+        if left == -1:
+          self.add_node(leaf_value=float(condition))
+        else:
+          # xgboost goes left on x < t in float32, which is x <= the previous float32
+          self.add_node(feature=tree["split_indices"][node],
+                        threshold=float(np.nextafter(condition, np.float32(-np.inf))),
+                        missing_left=bool(tree["default_left"][node]))
+          self.left[-1] = offset + left
+          self.right[-1] = offset + tree["right_children"][node]
+      self.roots.append(offset)
+    base_score = float(str(learner["learner_model_param"]["base_score"]).strip("[]"))
+    return len(trees), float(np.log(base_score / (1.0 - base_score)))
+
+  def add_lightgbm(self, model: Any) -> Tuple[int, float]:
+    best_iteration = getattr(model, "best_iteration_", 0) or None
+    dump = model.booster_.dump_model(num_iteration=best_iteration)
+    if dump["num_tree_per_iteration"] != 1 or not dump["objective"].startswith("binary"):
+      raise ValueError("Only binary LightGBM models can be flattened")
+    sigmoid = float(dump["objective"].split("sigmoid:")[1].split()[0]) if "sigmoid:" in dump["objective"] else 1.0
+    for tree in dump["tree_info"]:
+      self.roots.append(self._add_lightgbm_node(tree["tree_structure"]))
+    return len(dump["tree_info"]), sigmoid
+
+  def _add_lightgbm_node(self, node: Dict[str, Any]) -> int:
+    if "leaf_value" in node:
+      return self.add_node(leaf_value=float(node["leaf_value"]), float32_input=False)
+    if node["decision_type"] != "<=":
+      raise ValueError("Categorical LightGBM splits are not supported")
+    threshold = float(node["threshold"])
+    missing_type = node["missing_type"]
+    # with missing_type None lightgbm replaces NaN by 0 before comparing
+    missing_left = bool(node["default_left"]) if missing_type in ("NaN", "Zero") else 0.0 <= threshold
+    index = self.add_node(feature=node["split_feature"], threshold=threshold, missing_left=missing_left,
+                          zero_missing=missing_type == "Zero", float32_input=False)
+    self.left[index] = self._add_lightgbm_node(node["left_child"])
+    self.right[index] = self._add_lightgbm_node(node["right_child"])
+    return index
+
+  def add_sklearn_forest(self, model: Any) -> int:
+    if model.n_classes_ != 2:
+      raise ValueError("Only binary forests can be flattened")
+    for estimator in model.estimators_:
+      tree = estimator.tree_
+      nodes = tree.__getstate__()["nodes"]
+      missing_go_to_left = nodes["missing_go_to_left"] if "missing_go_to_left" in nodes.dtype.names else np.zeros(len(nodes))
+      values = tree.value[:, 0, :]
+      proba = values[:, 1] / values.sum(axis=1)
+      offset = len(self.feature)
+      for node in range(tree.node_count):
+        if tree.children_left[node] == -1:
+          self.add_node(leaf_value=float(proba[node]))
+        else:
+          self.add_node(feature=int(tree.feature[node]), threshold=float(tree.threshold[node]),
+                        missing_left=bool(missing_go_to_left[node]))
+          self.left[-1] = offset + int(tree.children_left[node])
+          self.right[-1] = offset + int(tree.children_right[node])
+      self.roots.append(offset)
+    return len(model.estimators_)
+
+class CompactTreeEnsemble:
+  """
+  Class Name  : CompactTreeEnsemble
+  Description : All trees of the XGBoost, LightGBM and sklearn/imblearn forest members of a
+                soft VotingClassifier flattened into contiguous node arrays, evaluated for a
+                whole batch with vectorized NumPy traversal and combined with the voting weights.
+  Output      : np.ndarray of class probabilities, same layout as VotingClassifier.predict_proba
+  On Failure  : Raise Exception for members or splits it cannot represent
+  """
+  def __init__(self, voting_classifier: Any):
+    try:
+      if getattr(voting_classifier, "voting", None) != "soft" or len(voting_classifier.classes_) != 2:
+        raise ValueError("Only binary soft VotingClassifier models can be flattened")
+      builder = _TreeBuilder()
+      # (kind, first tree, number of trees, parameter) per member
+      self.members: List[Tuple[str, int, int, float]] = []
+      for name, estimator in zip(voting_classifier.named_estimators_.keys(), voting_classifier.estimators_):
+        first_tree = len(builder.roots)
+        module = type(estimator).__module__
+        if module.startswith("xgboost"):
+          n_trees, base_margin = builder.add_xgboost(estimator)
+          self.members.append(("xgboost", first_tree, n_trees, base_margin))
+        elif module.startswith("lightgbm") or isinstance(estimator, LightGBMBoosterClassifier):
+          n_trees, sigmoid = builder.add_lightgbm(estimator)
+          self.members.append(("lightgbm", first_tree, n_trees, sigmoid))
+        elif hasattr(estimator, "estimators_") and all(hasattr(tree, "tree_") for tree in estimator.estimators_):
+          n_trees = builder.add_sklearn_forest(estimator)
+          self.members.append(("forest", first_tree, n_trees, 0.0))
+        else:
+          raise ValueError(f"Cannot flatten voting member {name} of type {type(estimator).__name__}")
+
+      self.feature = np.asarray(builder.feature, dtype=np.int32)
+      self.threshold = np.asarray(builder.threshold, dtype=np.float64)
+      self.left = np.asarray(builder.left, dtype=np.int32)
+      self.right = np.asarray(builder.right, dtype=np.int32)
+      self.missing_left = np.asarray(builder.missing_left, dtype=bool)
+      self.zero_missing = np.asarray(builder.zero_missing, dtype=bool)
+      self.has_zero_missing = bool(self.zero_missing.any())
+      self.is_leaf = np.asarray(builder.is_leaf, dtype=bool)
+      self.value = np.asarray(builder.value, dtype=np.float64)
+      self.float32_input = np.asarray(builder.float32_input, dtype=bool)
+      self.roots = np.asarray(builder.roots, dtype=np.int32)
+      weights = voting_classifier.weights
+      self.weights = np.ones(len(self.members)) if weights is None else np.asarray(weights, dtype=np.float64)
+      logging.info(f"Flattened {len(self.roots)} trees with {len(self.feature)} nodes into a compact ensemble")
+    except Exception as e:
+      logging.error(f"Error in cls CompactTreeEnsemble method __init__: {e}")
+      raise CustomException(e, sys)
+
+  @property
+  def nbytes(self) -> int:
+    return sum(array.nbytes for array in (self.feature, self.threshold, self.left, self.right, self.missing_left,
+                                          self.zero_missing, self.is_leaf, self.value, self.float32_input, self.roots))
+
+  def _leaf_values(self, X: np.ndarray) -> np.ndarray:
+    n_rows, n_features = X.shape
+    n_trees = len(self.roots)
+    # xgboost and sklearn trees see float32 features, lightgbm sees float64
+    x64 = np.ascontiguousarray(X, dtype=np.float64).ravel()
+    x32 = x64.astype(np.float32).astype(np.float64)
+    node = np.tile(self.roots, n_rows)
+    row_offset = np.repeat(np.arange(n_rows) * n_features, n_trees)
+    active = np.flatnonzero(~self.is_leaf[node])
+    while active.size:
+      current = node[active]
+      position = row_offset[active] + self.feature[current]
+      x = np.where(self.float32_input[current], x32[position], x64[position])
+      go_left = x <= self.threshold[current]
+      missing = np.isnan(x)
+      if self.has_zero_missing:
+        missing |= self.zero_missing[current] & (np.abs(x) <= LIGHTGBM_ZERO_THRESHOLD)
+      if missing.any():
+        go_left[missing] = self.missing_left[current[missing]]
+      node[active] = np.where(go_left, self.left[current], self.right[current])
+      active = active[~self.is_leaf[node[active]]]
+    return self.value[node].reshape(n_rows, n_trees)
+
+  def predict_proba(self, X: np.ndarray) -> np.ndarray:
+    leaves = self._leaf_values(np.atleast_2d(X))
+    member_proba = []
+    for kind, first_tree, n_trees, parameter in self.members:
+      member_leaves = leaves[:, first_tree:first_tree + n_trees]
+      if kind == "xgboost":
+        member_proba.append(_sigmoid(parameter + member_leaves.sum(axis=1)))
+      elif kind == "lightgbm":
+        member_proba.append(_sigmoid(parameter * member_leaves.sum(axis=1)))
+      else:
+        member_proba.append(member_leaves.mean(axis=1))
+    positive = np.average(np.column_stack(member_proba), axis=1, weights=self.weights)
+    return np.column_stack([1.0 - positive, positive])
@@ -0,0 +1,135 @@
+import argparse
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, Optional
+import pandas as pd
+
+from machine_failure.entity.config_entity import ModelBucketConfig
+from machine_failure.entity.model import MachineFailureModel
+from machine_failure.entity.s3_model import MachineFailureS3Model
+from machine_failure.exception.custom_exception import CustomException
+from machine_failure.logger.custom_logging import logging
+from machine_failure.utils.main_utils import load_object, prepare_prediction_features, read_yaml_file
+
+params = read_yaml_file("config/param.yaml")
+
+_worker_model: Optional[MachineFailureModel] = None
+
+def load_scoring_model(model_path: Optional[str] = None) -> MachineFailureModel:
+  """
+  Load a local pickled MachineFailureModel, or the served model from the S3 bucket
+  model_path: str optional location of a local model file
+  """
+  if model_path is not None:
+    return load_object(model_path)
+  config = ModelBucketConfig()
+  return MachineFailureS3Model(config.bucket_name, config.s3_model_key_path).get_model()
+
+def _init_worker(model_path: Optional[str]) -> None:
+  # each worker process loads the model once and reuses it for all its chunks
+  global _worker_model
+  _worker_model = load_scoring_model(model_path)
+
+def _score_in_worker(chunk: pd.DataFrame, schema: dict) -> pd.DataFrame:
+  return score_chunk(_worker_model, chunk, schema)
+
+def score_chunk(model: MachineFailureModel, chunk: pd.DataFrame, schema: dict) -> pd.DataFrame:
+  features = prepare_prediction_features(chunk.copy(), schema)
+  labels, proba = model.predict_with_proba(features)
+  result = chunk.copy()
+  result['prediction'] = labels
+  result['failure_probability'] = proba[:, 1]
+  return result
+
+class BatchScorer:
+  """
+  Class Name  : BatchScorer
+  Description : Scores a CSV or Parquet file chunk by chunk and appends the results to the
+                output file, so memory stays bounded by chunk_size * (2 * workers) rows
+                whatever the size of the input.
+  Output      : CSV or Parquet file with the input columns, prediction and failure_probability
+  On Failure  : Raise Exception
+  """
+  def __init__(self, input_path: str, output_path: str, chunk_size: int = 10000, workers: int = 1,
+               model_path: Optional[str] = None):
+    self.input_path = input_path
+    self.output_path = output_path
+    self.chunk_size = chunk_size
+    self.workers = workers
+    self.model_path = model_path
+    self.schema = read_yaml_file(os.path.join(params["config"]["dir"], params["config"]["schema_file_path"]))
+
+  def read_chunks(self) -> Iterator[pd.DataFrame]:
+    if self.input_path.endswith(".parquet"):
+      import pyarrow.parquet as pq
+      for batch in pq.ParquetFile(self.input_path).iter_batches(batch_size=self.chunk_size):
+        yield batch.to_pandas()
+    else:
+      yield from pd.read_csv(self.input_path, chunksize=self.chunk_size)
+
+  def score_chunks(self, chunks: Iterator[pd.DataFrame]) -> Iterator[pd.DataFrame]:
+    if self.workers <= 1:
+      model = load_scoring_model(self.model_path)
+      for chunk in chunks:
+        yield score_chunk(model, chunk, self.schema)
+      return
+
+    # only a small window of chunks is in flight, results are yielded in input order
+    with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker, initargs=(self.model_path,)) as pool:
+      pending = deque()
+      for chunk in chunks:
+        pending.append(pool.submit(_score_in_worker, chunk, self.schema))
+        if len(pending) >= 2 * self.workers:
+          yield pending.popleft().result()
+      while pending:
+        yield pending.popleft().result()
+
+  def run(self) -> float:
+    logging.info("Entered the run method of BatchScorer class")
+    try:
+      started_at = time.perf_counter()
+      n_rows = 0
+      writer = None
+      os.makedirs(os.path.dirname(os.path.abspath(self.output_path)), exist_ok=True)
+      try:
+        for result in self.score_chunks(self.read_chunks()):
+          if self.output_path.endswith(".parquet"):
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(result, preserve_index=False)
+            if writer is None:
+              writer = pq.ParquetWriter(self.output_path, table.schema)
+            writer.write_table(table)
+          else:
+            result.to_csv(self.output_path, mode='w' if n_rows == 0 else 'a', header=n_rows == 0, index=False)
+          n_rows += len(result)
+          logging.info(f"Scored {n_rows} rows")
+      finally:
+        if writer is not None:
+          writer.close()
+
+      elapsed = time.perf_counter() - started_at
+      rows_per_second = n_rows / elapsed if elapsed > 0 else 0.0
+      logging.info(f"Exiting the run method of BatchScorer class. Scored {n_rows} rows in {elapsed:.2f}s ({rows_per_second:.0f} rows/sec)")
+      print(f"Scored {n_rows} rows in {elapsed:.2f}s ({rows_per_second:.0f} rows/sec)")
+      return rows_per_second
+    except Exception as e:
+      logging.error(f"Error in cls BatchScorer method run: {e}")
+      raise CustomException(e, sys)
+
+def main():
+  parser = argparse.ArgumentParser(description="Batch scoring of machine readings")
+  parser.add_argument('input', help="CSV or Parquet file of machine readings")
+  parser.add_argument('output', help="CSV or Parquet file to write the predictions to")
+  parser.add_argument('--chunk-size', type=int, default=10000, help="Rows scored per chunk")
+  parser.add_argument('--workers', type=int, default=1, help="Processes scoring chunks in parallel")
+  parser.add_argument('--model', default=None, help="Local model file, the S3 model is used when omitted")
+  args = parser.parse_args()
+
+  BatchScorer(args.input, args.output, args.chunk_size, args.workers, args.model).run()
+
+if __name__ == '__main__':
+  main()
@@ -1,11 +1,55 @@
 import os
 import sys
+from io import BytesIO
+from typing import Any, Dict, List, Mapping, Optional, Tuple
 import numpy as np
 import pandas as pd
 
-from machine_failure.entity.config_entity import ModelBucketConfig
+from machine_failure.entity.compiled_preprocessor import CATEGORICAL_COLUMN, RAW_NUMERIC_COLUMNS
+from machine_failure.entity.config_entity import ModelBucketConfig, ServingConfig
+from machine_failure.entity.local_model import MachineFailureLocalModel
+from machine_failure.entity.model import MachineFailureModel
 from machine_failure.entity.s3_model import MachineFailureS3Model
 from machine_failure.exception.custom_exception import CustomException
+from machine_failure.logger.custom_logging import logging
+from machine_failure.utils.main_utils import parse_product_id
+
+INPUT_COLUMNS = {
+  'product_id': 'Product ID',
+  'type': 'Type',
+  'air_temperature': 'Air temperature [K]',
+  'process_temperature': 'Process temperature [K]',
+  'rotational_speed': 'Rotational speed [rpm]',
+  'torque': 'Torque [Nm]',
+  'tool_wear': 'Tool wear [min]',
+  'TWF': 'TWF',
+  'HDF': 'HDF',
+  'PWF': 'PWF',
+  'OSF': 'OSF'
+}
+FAILURE_FLAGS = ['TWF', 'HDF', 'PWF', 'OSF']
+MACHINE_TYPES = ('L', 'M', 'H')
+
+def make_synthetic_batch(batch_size: int, seed: int = 42) -> pd.DataFrame:
+  """
+  Build plausible machine readings used to warm up the model
+  batch_size: int number of rows to generate
+  return: pandas DataFrame with the prediction input columns
+  """
+  rng = np.random.default_rng(seed)
+  return pd.DataFrame({
+    'Product ID': rng.integers(10000, 60000, batch_size),
+    'Type': rng.choice(['L', 'M', 'H'], batch_size),
+    'Air temperature [K]': rng.normal(300.0, 2.0, batch_size),
+    'Process temperature [K]': rng.normal(310.0, 1.5, batch_size),
+    'Rotational speed [rpm]': rng.integers(1200, 2900, batch_size),
+    'Torque [Nm]': rng.normal(40.0, 10.0, batch_size),
+    'Tool wear [min]': rng.integers(0, 250, batch_size),
+    'TWF': np.zeros(batch_size, dtype=int),
+    'HDF': np.zeros(batch_size, dtype=int),
+    'PWF': np.zeros(batch_size, dtype=int),
+    'OSF': np.zeros(batch_size, dtype=int)
+  })
 
 class MachineData:
   def __init__(self, product_id: int, type: str, air_temperature: float, 
@@ -53,11 +97,137 @@ class MachineData:
     except Exception as e:
       raise CustomException(e, sys)
 
+  def convert_to_array(self) -> "MachineArrayData":
+    try:
+      numeric = np.array([[self.product_id, self.air_temperature, self.process_temperature, self.rotational_speed,
+                           self.torque, self.tool_wear, self.TWF, self.HDF, self.PWF, self.OSF]], dtype=np.float64)
+      return MachineArrayData(numeric, [self.type])
+    except Exception as e:
+      raise CustomException(e, sys)
+
+class MachineArrayData:
+  """
+  Readings held as a (n, 10) float array of RAW_NUMERIC_COLUMNS plus their machine types,
+  the input of the compiled preprocessing fast path.
+  """
+  def __init__(self, numeric: np.ndarray, types: List[str]) -> None:
+    self.numeric = numeric
+    self.types = types
+
+  def __len__(self) -> int:
+    return len(self.types)
+
+  @classmethod
+  def from_columns(cls, columns: Mapping[str, Any]) -> "MachineArrayData":
+    """
+    Build from whole columns keyed by the schema.yaml column names or the form field names.
+    Each column is converted with one array operation, missing failure flags are 0.
+    """
+    try:
+      columns = {INPUT_COLUMNS.get(name, name): value for name, value in columns.items()}
+      missing = [col for col in INPUT_COLUMNS.values() if col not in columns and col not in FAILURE_FLAGS]
+      if missing:
+        raise ValueError(f"Missing columns in input: {missing}")
+      types = np.asarray(columns[CATEGORICAL_COLUMN]).astype(str).tolist()
+      numeric = np.zeros((len(types), len(RAW_NUMERIC_COLUMNS)), dtype=np.float64)
+      for position, column in enumerate(RAW_NUMERIC_COLUMNS):
+        if column not in columns:
+          continue
+        values = np.asarray(columns[column])
+        if len(values) != len(types):
+          raise ValueError(f"Column {column} has {len(values)} values, expected {len(types)}")
+        if column == 'Product ID' and values.dtype.kind not in 'biuf':
+          values = parse_product_id(pd.Series(values)).to_numpy()
+        numeric[:, position] = values
+      data = cls(numeric, types)
+      data.validate()
+      return data
+    except Exception as e:
+      raise CustomException(e, sys)
+
+  @classmethod
+  def from_npy(cls, content: bytes) -> "MachineArrayData":
+    """
+    Decode a .npy structured array whose field names are the input columns
+    """
+    try:
+      array = np.atleast_1d(np.load(BytesIO(content), allow_pickle=False))
+      if array.dtype.names is None:
+        raise ValueError("Expected a structured array with one field per input column")
+      return cls.from_columns({name: array[name] for name in array.dtype.names})
+    except Exception as e:
+      raise CustomException(e, sys)
+
+  @classmethod
+  def from_arrow(cls, content: bytes) -> "MachineArrayData":
+    """
+    Decode an Arrow IPC stream whose column names are the input columns
+    """
+    try:
+      import pyarrow as pa
+      table = pa.ipc.open_stream(content).read_all()
+      return cls.from_columns({name: table.column(name).to_numpy() for name in table.column_names})
+    except Exception as e:
+      raise CustomException(e, sys)
+
+  def validate(self) -> None:
+    """
+    Raise ValueError for a machine type the model does not know or a missing or infinite value
+    """
+    unknown = sorted(set(self.types) - set(MACHINE_TYPES))
+    if unknown:
+      raise ValueError(f"Unknown machine types {unknown}, expected one of {list(MACHINE_TYPES)}")
+    if not np.isfinite(self.numeric).all():
+      raise ValueError("Readings must not contain missing or infinite values")
+
+  def reading(self, index: int = 0) -> Dict[str, Any]:
+    """
+    One row keyed by the form field names, in the order of MachineData
+    """
+    values = dict(zip(RAW_NUMERIC_COLUMNS, self.numeric[index]))
+    values[CATEGORICAL_COLUMN] = self.types[index]
+    return {name: values[column] for name, column in INPUT_COLUMNS.items()}
+
+  @staticmethod
+  def concat(items: List["MachineArrayData"]) -> "MachineArrayData":
+    return MachineArrayData(np.concatenate([item.numeric for item in items]),
+                            [value for item in items for value in item.types])
+
+class MachineBatchData:
+  """
+  Readings of many machines scored together in one vectorized call.
+  Each record may use either the form field names (air_temperature, ...)
+  or the dataset column names (Air temperature [K], ...), MachineReadings
+  validates them.
+  """
+  def __init__(self, records: List[Dict[str, Any]]) -> None:
+    try:
+      if not isinstance(records, list):
+        raise ValueError("Batch input must be a list of readings")
+      self.records = records
+    except Exception as e:
+      raise CustomException(e, sys)
+
+  @classmethod
+  def from_csv(cls, content: bytes) -> "MachineBatchData":
+    try:
+      df = pd.read_csv(BytesIO(content))
+      return cls(df.to_dict(orient="records"))
+    except Exception as e:
+      raise CustomException(e, sys)
+
+  def __len__(self) -> int:
+    return len(self.records)
+
 class MachineClassifier:
   def __init__(self) -> None:
     try:
         self.config = ModelBucketConfig()
-        self.model =  MachineFailureS3Model(self.config.bucket_name, self.config.s3_model_key_path)
+        self.serving_config = ServingConfig()
+        if self.serving_config.local_model_path:
+          self.model = MachineFailureLocalModel(self.serving_config.local_model_path)
+        else:
+          self.model =  MachineFailureS3Model(self.config.bucket_name, self.config.s3_model_key_path)
     except Exception as e:
         raise CustomException(e, sys)
 
@@ -66,4 +236,93 @@ class MachineClassifier:
       result =  self.model.predict(df)
       return result
     except Exception as e:
+      raise CustomException(e, sys)
+
+  def predict_with_proba(self, df: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+    try:
+      return self.model.predict_with_proba(df)
+    except Exception as e:
+      raise CustomException(e, sys)
+
+  def predict_arrays(self, data: MachineArrayData) -> np.ndarray:
+    try:
+      return self.model.predict_with_proba_arrays(data.numeric, data.types)[0]
+    except Exception as e:
+      raise CustomException(e, sys)
+
+  def predict_with_proba_arrays(self, data: MachineArrayData) -> Tuple[np.ndarray, np.ndarray]:
+    try:
+      return self.model.predict_with_proba_arrays(data.numeric, data.types)
+    except Exception as e:
+      raise CustomException(e, sys)
+
+  def load(self) -> None:
+    logging.info("Entered the load method of MachineClassifier class")
+    try:
+      self.model.get_model()
+      logging.info("Exiting the load method of MachineClassifier class")
+    except Exception as e:
+      logging.error(f"Error in cls MachineClassifier method load: {e}")
+      raise CustomException(e, sys)
+
+  def _warm_up_model(self, model: MachineFailureModel, batch_size: int) -> None:
+    if self.serving_config.preprocessing_mode == "compiled":
+      try:
+        model.compile(self.serving_config.preprocessing_dtype)
+      except Exception as e:
+        logging.error(f"Compiled preprocessing disabled, using the sklearn pipeline: {e}")
+    if self.serving_config.inference_backend != "sklearn":
+      try:
+        model.use_backend(self.serving_config.inference_backend, self.serving_config.compact_max_rows)
+      except Exception as e:
+        logging.error(f"Inference backend {self.serving_config.inference_backend} disabled, using sklearn: {e}")
+    if self.serving_config.parallel_members_enabled:
+      try:
+        model.use_parallel_members(self.serving_config.parallel_members_cpu_budget)
+      except Exception as e:
+        logging.error(f"Parallel voting members disabled: {e}")
+    if self.serving_config.cascade_enabled:
+      try:
+        model.use_cascade(self.serving_config.cascade_first_stage, self.serving_config.cascade_band)
+      except Exception as e:
+        logging.error(f"Cascade disabled, every row is scored by the ensemble: {e}")
+    # a single row and a full batch prime both the per-row and the vectorized code paths
+    model.predict_proba(make_synthetic_batch(1))
+    model.predict_with_proba(make_synthetic_batch(batch_size))
+
+  def warm_up(self, batch_size: int) -> None:
+    logging.info("Entered the warm_up method of MachineClassifier class")
+    try:
+      self._warm_up_model(self.model.get_model(), batch_size)
+      logging.info("Exiting the warm_up method of MachineClassifier class")
+    except Exception as e:
+      logging.error(f"Error in cls MachineClassifier method warm_up: {e}")
+      raise CustomException(e, sys)
+
+  def after_fork(self) -> None:
+    self.model.reset_connection()
+
+  def get_model_version(self) -> Optional[str]:
+    return self.model.model_version
+
+  def get_remote_version(self) -> str:
+    try:
+      return self.model.get_remote_version()
+    except Exception as e:
+      raise CustomException(e, sys)
+
+  def reload(self, batch_size: int) -> str:
+    """
+    Download the latest model, warm it and swap it in for the served one.
+    Requests running during the reload keep using the previous model.
+    """
+    logging.info("Entered the reload method of MachineClassifier class")
+    try:
+      new_model, version = self.model.load_model_version()
+      self._warm_up_model(new_model, batch_size)
+      self.model.swap_model(new_model, version)
+      logging.info("Exiting the reload method of MachineClassifier class")
+      return version
+    except Exception as e:
+      logging.error(f"Error in cls MachineClassifier method reload: {e}")
       raise CustomException(e, sys)
\ No newline at end of file
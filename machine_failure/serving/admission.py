@@ -0,0 +1,143 @@
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Optional
+
+from machine_failure.logger.custom_logging import logging
+from machine_failure.serving.metrics import registry
+
+SINGLE = "single"
+BATCH = "batch"
+PRIORITIES = (SINGLE, BATCH)
+
+class RequestShed(Exception):
+  """
+  Raised when a request is rejected before it is scored
+  status_code: 429 when the queue is full, 503 when the deadline cannot be met
+  """
+  def __init__(self, status_code: int, reason: str, retry_after: float):
+    super().__init__(f"Request shed ({reason}), retry in {retry_after:.0f}s")
+    self.status_code = status_code
+    self.reason = reason
+    self.retry_after = retry_after
+
+class AdmissionController:
+  """
+  Class Name  : AdmissionController
+  Description : Bounds the number of prediction requests being worked on. Requests over the
+                limit wait in one queue per priority, single-machine requests are always
+                admitted before batch requests and batches never hold more than
+                batch_max_in_flight slots. A request is shed up front with 429 when the
+                queue is full and with 503 when its estimated wait would run past its
+                deadline, or when the deadline passes while it waits.
+  Output      : async context manager holding an in-flight slot
+  On Failure  : Raise RequestShed
+  """
+  def __init__(self, max_in_flight: int, batch_max_in_flight: int, max_queue: int):
+    self.max_in_flight = max_in_flight
+    self.batch_max_in_flight = min(batch_max_in_flight, max_in_flight)
+    self.max_queue = max_queue
+    self.in_flight: Dict[str, int] = {priority: 0 for priority in PRIORITIES}
+    self.waiters: Dict[str, Deque[asyncio.Future]] = {priority: deque() for priority in PRIORITIES}
+    # moving average of the time a request holds its slot, used to estimate queue waits
+    self.service_time: Dict[str, Optional[float]] = {priority: None for priority in PRIORITIES}
+    self.in_flight_gauges = {priority: registry.gauge("admission_in_flight", "Prediction requests being worked on",
+                                                      labels={"priority": priority}) for priority in PRIORITIES}
+    self.queued_gauges = {priority: registry.gauge("admission_queued", "Prediction requests waiting for admission",
+                                                   labels={"priority": priority}) for priority in PRIORITIES}
+    self.wait_histograms = {priority: registry.histogram("admission_wait_seconds", "Time a request waited for admission",
+                                                         labels={"priority": priority}) for priority in PRIORITIES}
+
+  def _can_start(self, priority: str) -> bool:
+    if sum(self.in_flight.values()) >= self.max_in_flight:
+      return False
+    return priority == SINGLE or self.in_flight[BATCH] < self.batch_max_in_flight
+
+  def _queued_ahead(self, priority: str) -> int:
+    if priority == SINGLE:
+      return len(self.waiters[SINGLE])
+    return len(self.waiters[SINGLE]) + len(self.waiters[BATCH])
+
+  def estimate_wait(self, priority: str) -> float:
+    service_time = self.service_time[priority]
+    if service_time is None:
+      return 0.0
+    slots = self.max_in_flight if priority == SINGLE else self.batch_max_in_flight
+    return (self._queued_ahead(priority) + 1) * service_time / max(1, slots)
+
+  def _update_gauges(self) -> None:
+    for priority in PRIORITIES:
+      self.in_flight_gauges[priority].set(self.in_flight[priority])
+      self.queued_gauges[priority].set(len(self.waiters[priority]))
+
+  def _shed(self, priority: str, status_code: int, reason: str, retry_after: float) -> RequestShed:
+    registry.counter("requests_shed_total", "Prediction requests rejected by admission control",
+                     labels={"priority": priority, "reason": reason}).inc()
+    logging.warning(f"Shedding {priority} request: {reason}")
+    return RequestShed(status_code, reason, max(1.0, math.ceil(retry_after)))
+
+  def _wake(self) -> None:
+    for priority in PRIORITIES:
+      waiters = self.waiters[priority]
+      while waiters and self._can_start(priority):
+        future = waiters.popleft()
+        if future.done():
+          continue
+        # the slot is taken on behalf of the waiter before it resumes
+        self.in_flight[priority] += 1
+        future.set_result(None)
+    self._update_gauges()
+
+  def _release(self, priority: str, held_seconds: Optional[float] = None) -> None:
+    self.in_flight[priority] -= 1
+    if held_seconds is not None:
+      previous = self.service_time[priority]
+      self.service_time[priority] = held_seconds if previous is None else 0.9 * previous + 0.1 * held_seconds
+    self._wake()
+
+  async def _acquire(self, priority: str, deadline: float) -> None:
+    loop = asyncio.get_running_loop()
+    queued_at = loop.time()
+    if self._queued_ahead(priority) == 0 and self._can_start(priority):
+      self.in_flight[priority] += 1
+      self._update_gauges()
+      self.wait_histograms[priority].observe(0.0)
+      return
+    if sum(len(waiters) for waiters in self.waiters.values()) >= self.max_queue:
+      raise self._shed(priority, 429, "queue_full", self.estimate_wait(priority))
+    estimated_wait = self.estimate_wait(priority)
+    if queued_at + estimated_wait > deadline:
+      raise self._shed(priority, 503, "deadline", estimated_wait)
+
+    future = loop.create_future()
+    self.waiters[priority].append(future)
+    self._update_gauges()
+    try:
+      await asyncio.wait_for(future, deadline - queued_at)
+    except BaseException as e:
+      # timed out or cancelled after the slot was handed over, give it back
+      if future.done() and not future.cancelled():
+        self._release(priority)
+      if isinstance(e, asyncio.TimeoutError):
+        raise self._shed(priority, 503, "timeout", self.estimate_wait(priority))
+      raise
+    finally:
+      if future in self.waiters[priority]:
+        self.waiters[priority].remove(future)
+      self._update_gauges()
+    self.wait_histograms[priority].observe(loop.time() - queued_at)
+
+  @asynccontextmanager
+  async def admit(self, priority: str, deadline_seconds: float):
+    """
+    priority: SINGLE or BATCH
+    deadline_seconds: time budget of the request from now
+    """
+    await self._acquire(priority, asyncio.get_running_loop().time() + deadline_seconds)
+    started_at = time.perf_counter()
+    try:
+      yield
+    finally:
+      self._release(priority, time.perf_counter() - started_at)
@@ -0,0 +1,131 @@
+import asyncio
+import sys
+import time
+from functools import partial
+from typing import Any, Awaitable, Callable, List, Optional, Sequence, Set, Tuple
+import numpy as np
+import pandas as pd
+
+from machine_failure.exception.custom_exception import CustomException
+from machine_failure.logger.custom_logging import logging
+from machine_failure.serving.metrics import SIZE_BUCKETS, registry
+
+class PredictionBatcher:
+  """
+  Class Name  : PredictionBatcher
+  Description : Coalesces concurrent single-reading requests into one DataFrame and
+                scores it with a single predict call. A batch is flushed as soon as it
+                holds max_batch_size rows or its first request waited max_wait_ms.
+                Batches are scored in background tasks so collection of the next
+                batch continues while the previous one is in the worker pool.
+                Requests are DataFrames by default, any sized input works with a matching concat_fn.
+                validate_fn checks each request before it joins a batch.
+  Output      : per-request slice of the batch prediction
+  On Failure  : a request failing validate_fn raises in its caller without being enqueued.
+                When a batch fails, its requests are scored again one by one, so only the
+                requests that fail on their own get the exception.
+  """
+  def __init__(self, predict_fn: Callable[[Any], Awaitable[np.ndarray]], max_batch_size: int, max_wait_ms: float,
+               concat_fn: Callable[[Sequence[Any]], Any] = partial(pd.concat, ignore_index=True),
+               validate_fn: Optional[Callable[[Any], None]] = None):
+    self.predict_fn = predict_fn
+    self.concat_fn = concat_fn
+    self.validate_fn = validate_fn
+    self.max_batch_size = max_batch_size
+    self.max_wait = max_wait_ms / 1000
+    self.queue: Optional[asyncio.Queue] = None
+    self._task: Optional[asyncio.Task] = None
+    self._flushes: Set[asyncio.Task] = set()
+    self.batch_size_histogram = registry.histogram("prediction_batch_size", "Number of rows per coalesced prediction batch",
+                                                   buckets=SIZE_BUCKETS)
+    self.queue_wait_histogram = registry.histogram("prediction_queue_wait_seconds", "Time a request waited in the batching queue")
+    self.isolated_counter = registry.counter("prediction_batch_isolated_total",
+                                             "Failed batches whose requests were scored again one by one")
+
+  async def start(self) -> None:
+    logging.info("Entered the start method of PredictionBatcher class")
+    self.queue = asyncio.Queue()
+    self._task = asyncio.create_task(self._run())
+
+  async def stop(self) -> None:
+    logging.info("Entered the stop method of PredictionBatcher class")
+    if self._task is not None:
+      self._task.cancel()
+      try:
+        await self._task
+      except asyncio.CancelledError:
+        pass
+      self._task = None
+    if self._flushes:
+      await asyncio.gather(*self._flushes, return_exceptions=True)
+
+  async def submit(self, df: pd.DataFrame) -> np.ndarray:
+    if self.validate_fn is not None:
+      self.validate_fn(df)
+    future = asyncio.get_running_loop().create_future()
+    await self.queue.put((df, future, time.perf_counter()))
+    return await future
+
+  async def _collect(self) -> List[Tuple[pd.DataFrame, asyncio.Future, float]]:
+    loop = asyncio.get_running_loop()
+    batch = [await self.queue.get()]
+    rows = len(batch[0][0])
+    deadline = loop.time() + self.max_wait
+    while rows < self.max_batch_size:
+      timeout = deadline - loop.time()
+      if timeout <= 0:
+        break
+      try:
+        item = await asyncio.wait_for(self.queue.get(), timeout)
+      except asyncio.TimeoutError:
+        break
+      batch.append(item)
+      rows += len(item[0])
+    return batch
+
+  async def _run(self) -> None:
+    while True:
+      batch = await self._collect()
+      task = asyncio.create_task(self._flush(batch))
+      self._flushes.add(task)
+      task.add_done_callback(self._flushes.discard)
+
+  async def _flush(self, batch: List[Tuple[pd.DataFrame, asyncio.Future, float]]) -> None:
+    flushed_at = time.perf_counter()
+    frames = [df for df, _, _ in batch]
+    for _, _, enqueued_at in batch:
+      self.queue_wait_histogram.observe(flushed_at - enqueued_at)
+    try:
+      df = self.concat_fn(frames)
+      self.batch_size_histogram.observe(len(df))
+      result = await self.predict_fn(df)
+    except Exception as e:
+      logging.error(f"Error in cls PredictionBatcher method _flush: {e}")
+      if len(batch) == 1:
+        self._fail(batch[0][1], e)
+      else:
+        # one bad request must not fail the others sharing its window
+        await self._flush_each(batch)
+      return
+
+    start = 0
+    for frame, future, _ in batch:
+      end = start + len(frame)
+      if not future.done():
+        future.set_result(result[start:end])
+      start = end
+
+  async def _flush_each(self, batch: List[Tuple[pd.DataFrame, asyncio.Future, float]]) -> None:
+    self.isolated_counter.inc()
+    for frame, future, _ in batch:
+      try:
+        result = await self.predict_fn(frame)
+      except Exception as e:
+        self._fail(future, e)
+        continue
+      if not future.done():
+        future.set_result(result)
+
+  def _fail(self, future: asyncio.Future, error: Exception) -> None:
+    if not future.done():
+      future.set_exception(CustomException(error, sys))
@@ -0,0 +1,107 @@
+import asyncio
+import sys
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Optional
+
+from machine_failure.exception.custom_exception import CustomException
+from machine_failure.logger.custom_logging import logging
+from machine_failure.serving.metrics import registry
+
+_worker_classifier = None
+
+def _init_process_worker() -> None:
+  # every worker process owns its own classifier, the model is loaded on its first call
+  global _worker_classifier
+  from machine_failure.pipeline.prediction_pipeline import MachineClassifier
+  _worker_classifier = MachineClassifier()
+
+def _call_process_worker(method: str, *args: Any) -> Any:
+  return getattr(_worker_classifier, method)(*args)
+
+class InferenceExecutor:
+  """
+  Class Name  : InferenceExecutor
+  Description : Runs blocking MachineClassifier calls on a thread or process pool so the
+                event loop keeps accepting requests. At most max_workers calls are handed
+                to the pool at once, the rest wait on the event loop.
+  Output      : result of the classifier method
+  On Failure  : Raise Exception
+  """
+  def __init__(self, classifier: object, kind: str = "thread", max_workers: int = 4):
+    if kind not in ("thread", "process"):
+      raise CustomException(f"Unknown inference executor kind: {kind}", sys)
+    self.classifier = classifier
+    self.kind = kind
+    self.max_workers = max_workers
+    self.pool: Optional[Executor] = None
+    self._semaphore: Optional[asyncio.Semaphore] = None
+    self.busy_gauge = registry.gauge("inference_pool_busy_workers", "Inference calls currently running in the worker pool")
+    self.waiting_gauge = registry.gauge("inference_pool_waiting_calls", "Inference calls waiting for a free worker")
+    self.saturation_gauge = registry.gauge("inference_pool_saturation", "Fraction of inference workers in use")
+    self.wait_histogram = registry.histogram("inference_pool_wait_seconds", "Time an inference call waited for a free worker")
+    self.run_histogram = registry.histogram("inference_pool_run_seconds", "Time an inference call spent in the worker pool")
+
+  def start(self) -> None:
+    logging.info(f"Starting {self.kind} inference pool with {self.max_workers} workers")
+    if self.kind == "thread":
+      self.pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="inference")
+    else:
+      self.pool = ProcessPoolExecutor(max_workers=self.max_workers, initializer=_init_process_worker)
+    self._semaphore = asyncio.Semaphore(self.max_workers)
+
+  async def warm_up(self, batch_size: int) -> None:
+    # threads share one classifier, while each worker process holds its own copy, so the
+    # warm-up is sent once per worker to make the pool spawn and warm all of them
+    calls = 1 if self.kind == "thread" else self.max_workers
+    await asyncio.gather(*(self.run("warm_up", batch_size) for _ in range(calls)))
+
+  async def replace_pool(self, batch_size: int) -> None:
+    """
+    Start a fresh process pool, whose workers load the current model, warm it and swap
+    it in. Calls already submitted to the old pool finish there before it exits.
+    """
+    logging.info("Entered the replace_pool method of InferenceExecutor class")
+    new_pool = ProcessPoolExecutor(max_workers=self.max_workers, initializer=_init_process_worker)
+    try:
+      await asyncio.gather(*(asyncio.wrap_future(new_pool.submit(_call_process_worker, "warm_up", batch_size))
+                             for _ in range(self.max_workers)))
+    except Exception as e:
+      new_pool.shutdown(wait=False, cancel_futures=True)
+      logging.error(f"Error in cls InferenceExecutor method replace_pool: {e}")
+      raise CustomException(e, sys)
+    old_pool, self.pool = self.pool, new_pool
+    old_pool.shutdown(wait=False)
+    logging.info("Exiting the replace_pool method of InferenceExecutor class")
+
+  def shutdown(self) -> None:
+    logging.info("Shutting down inference pool")
+    if self.pool is not None:
+      self.pool.shutdown(wait=True, cancel_futures=True)
+      self.pool = None
+
+  async def run(self, method: str, *args: Any) -> Any:
+    loop = asyncio.get_running_loop()
+    if self.kind == "thread":
+      call = partial(getattr(self.classifier, method), *args)
+    else:
+      call = partial(_call_process_worker, method, *args)
+
+    queued_at = time.perf_counter()
+    self.waiting_gauge.inc()
+    try:
+      await self._semaphore.acquire()
+    finally:
+      self.waiting_gauge.dec()
+    started_at = time.perf_counter()
+    self.wait_histogram.observe(started_at - queued_at)
+    self.busy_gauge.inc()
+    self.saturation_gauge.set(self.busy_gauge.value / self.max_workers)
+    try:
+      return await loop.run_in_executor(self.pool, call)
+    finally:
+      self._semaphore.release()
+      self.busy_gauge.dec()
+      self.saturation_gauge.set(self.busy_gauge.value / self.max_workers)
+      self.run_histogram.observe(time.perf_counter() - started_at)
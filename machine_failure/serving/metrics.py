@@ -0,0 +1,149 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from typing import Dict, List, Optional, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...], extra: Optional[Tuple[str, str]] = None) -> str:
+  items = list(labels) + ([extra] if extra else [])
+  if not items:
+    return ""
+  return "{" + ",".join(f'{key}="{value}"' for key, value in items) + "}"
+
+class Counter:
+  type_name = "counter"
+
+  def __init__(self, name: str, description: str, labels: Tuple[Tuple[str, str], ...] = ()):
+    self.name = name
+    self.description = description
+    self.labels = labels
+    self.value = 0.0
+    self._lock = threading.Lock()
+
+  def inc(self, amount: float = 1.0) -> None:
+    with self._lock:
+      self.value += amount
+
+  def samples(self) -> List[str]:
+    return [f"{self.name}{_format_labels(self.labels)} {self.value}"]
+
+class Gauge(Counter):
+  type_name = "gauge"
+
+  def set(self, value: float) -> None:
+    with self._lock:
+      self.value = value
+
+  def dec(self, amount: float = 1.0) -> None:
+    with self._lock:
+      self.value -= amount
+
+class Histogram:
+  type_name = "histogram"
+
+  def __init__(self, name: str, description: str, buckets: Sequence[float] = LATENCY_BUCKETS,
+               labels: Tuple[Tuple[str, str], ...] = ()):
+    self.name = name
+    self.description = description
+    self.labels = labels
+    self.buckets = tuple(buckets)
+    self.counts = [0] * (len(self.buckets) + 1)
+    self.sum = 0.0
+    self.count = 0
+    self._lock = threading.Lock()
+
+  def observe(self, value: float) -> None:
+    index = bisect_left(self.buckets, value)
+    with self._lock:
+      self.counts[index] += 1
+      self.sum += value
+      self.count += 1
+
+  def samples(self) -> List[str]:
+    with self._lock:
+      counts, total, count = list(self.counts), self.sum, self.count
+    lines = []
+    cumulative = 0
+    for bound, bucket_count in zip(self.buckets, counts):
+      cumulative += bucket_count
+      lines.append(f"{self.name}_bucket{_format_labels(self.labels, ('le', str(bound)))} {cumulative}")
+    lines.append(f"{self.name}_bucket{_format_labels(self.labels, ('le', '+Inf'))} {count}")
+    lines.append(f"{self.name}_sum{_format_labels(self.labels)} {total}")
+    lines.append(f"{self.name}_count{_format_labels(self.labels)} {count}")
+    return lines
+
+class MetricsRegistry:
+  """
+  Class Name  : MetricsRegistry
+  Description : Holds the serving metrics and renders them in the Prometheus text format
+  Output      : str exposition served at /metrics
+  """
+  def __init__(self):
+    self.metrics: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], object] = {}
+    self._lock = threading.Lock()
+
+  def _get_or_create(self, cls, name: str, description: str, labels: Optional[Dict[str, str]], **kwargs):
+    key = (name, tuple(sorted((labels or {}).items())))
+    with self._lock:
+      if key not in self.metrics:
+        self.metrics[key] = cls(name, description, labels=key[1], **kwargs)
+      return self.metrics[key]
+
+  def counter(self, name: str, description: str, labels: Optional[Dict[str, str]] = None) -> Counter:
+    return self._get_or_create(Counter, name, description, labels)
+
+  def gauge(self, name: str, description: str, labels: Optional[Dict[str, str]] = None) -> Gauge:
+    return self._get_or_create(Gauge, name, description, labels)
+
+  def histogram(self, name: str, description: str, buckets: Sequence[float] = LATENCY_BUCKETS,
+                labels: Optional[Dict[str, str]] = None) -> Histogram:
+    return self._get_or_create(Histogram, name, description, labels, buckets=buckets)
+
+  def render(self) -> str:
+    with self._lock:
+      metrics = sorted(self.metrics.items(), key=lambda item: item[0])
+    lines = []
+    seen = set()
+    for (name, _), metric in metrics:
+      if name not in seen:
+        seen.add(name)
+        lines.append(f"# HELP {name} {metric.description}")
+        lines.append(f"# TYPE {name} {metric.type_name}")
+      lines.extend(metric.samples())
+    return "\n".join(lines) + "\n"
+
+class StageTimer:
+  """
+  Class Name  : StageTimer
+  Description : Times the stages of the prediction path into the prediction_stage_seconds
+                histogram and counts failed stages. While disabled, time() hands back a
+                shared no-op context manager, so instrumented code costs one method call.
+  Output      : context manager wrapping the timed stage
+  """
+  def __init__(self, metrics_registry: MetricsRegistry, enabled: bool = False):
+    self.registry = metrics_registry
+    self.enabled = enabled
+    self._disabled = nullcontext()
+
+  def time(self, stage: str, **labels: str):
+    if not self.enabled:
+      return self._disabled
+    return self._timed({"stage": stage, **labels})
+
+  @contextmanager
+  def _timed(self, labels: Dict[str, str]):
+    started_at = time.perf_counter()
+    try:
+      yield
+    except Exception:
+      self.registry.counter("prediction_stage_errors_total", "Prediction stages that raised an error", labels=labels).inc()
+      raise
+    finally:
+      self.registry.histogram("prediction_stage_seconds", "Time spent in each stage of the prediction path",
+                              labels=labels).observe(time.perf_counter() - started_at)
+
+registry = MetricsRegistry()
+stage_timer = StageTimer(registry)
@@ -0,0 +1,90 @@
+import threading
+import time
+from collections import OrderedDict
+from numbers import Number
+from typing import Any, Dict, Hashable, Iterable, Optional, Tuple
+
+from machine_failure.logger.custom_logging import logging
+from machine_failure.serving.metrics import registry
+
+class PredictionCache:
+  """
+  Class Name  : PredictionCache
+  Description : In-process LRU cache of predictions keyed by the normalized reading, so a
+                resent reading is answered without running the ensemble. Entries expire
+                after ttl_seconds, the least recently used entry is dropped beyond max_entries
+                and the whole cache is cleared when the served model version changes.
+                Fields listed in resolution are quantized to that step before keying.
+  Output      : cached prediction or None
+  On Failure  : a reading that cannot be keyed is simply not cached
+  """
+  def __init__(self, max_entries: int, ttl_seconds: float, resolution: Iterable[Tuple[str, float]] = ()):
+    self.max_entries = max_entries
+    self.ttl = ttl_seconds
+    self.resolution: Dict[str, float] = dict(resolution)
+    self.model_version: Optional[str] = None
+    self.entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+    self._lock = threading.Lock()
+    self.hit_counter = registry.counter("prediction_cache_hits_total", "Predictions answered from the prediction cache")
+    self.miss_counter = registry.counter("prediction_cache_misses_total", "Predictions not found in the prediction cache")
+    self.size_gauge = registry.gauge("prediction_cache_entries", "Entries currently held by the prediction cache")
+
+  def _evicted(self, reason: str, count: int = 1) -> None:
+    registry.counter("prediction_cache_evictions_total", "Entries removed from the prediction cache",
+                     labels={"reason": reason}).inc(count)
+
+  def make_key(self, values: Dict[str, Any]) -> Hashable:
+    """
+    values: dict of reading field name to value, in a fixed field order
+    """
+    key = []
+    for name, value in values.items():
+      if name in self.resolution:
+        key.append(round(float(value) / self.resolution[name]))
+      elif isinstance(value, Number):
+        # 1 and 1.0 are the same reading
+        key.append(float(value))
+      else:
+        key.append(str(value))
+    return tuple(key)
+
+  def _check_version(self, model_version: Optional[str]) -> None:
+    if model_version != self.model_version:
+      if self.entries:
+        logging.info(f"Model version changed to {model_version}, clearing {len(self.entries)} cached predictions")
+        self._evicted("model_version", len(self.entries))
+        self.entries.clear()
+      self.model_version = model_version
+
+  def get(self, key: Hashable, model_version: Optional[str]) -> Optional[Any]:
+    with self._lock:
+      self._check_version(model_version)
+      entry = self.entries.get(key)
+      if entry is not None and entry[0] < time.monotonic():
+        del self.entries[key]
+        self._evicted("ttl")
+        entry = None
+      if entry is None:
+        self.miss_counter.inc()
+        self.size_gauge.set(len(self.entries))
+        return None
+      self.entries.move_to_end(key)
+      self.hit_counter.inc()
+      return entry[1]
+
+  def put(self, key: Hashable, value: Any, model_version: Optional[str]) -> None:
+    with self._lock:
+      if model_version != self.model_version:
+        # computed by a model that was swapped out while the request ran
+        return
+      self.entries[key] = (time.monotonic() + self.ttl, value)
+      self.entries.move_to_end(key)
+      while len(self.entries) > self.max_entries:
+        self.entries.popitem(last=False)
+        self._evicted("size")
+      self.size_gauge.set(len(self.entries))
+
+  def clear(self) -> None:
+    with self._lock:
+      self.entries.clear()
+      self.size_gauge.set(0)
@@ -0,0 +1,101 @@
+import gc
+import os
+import signal
+import socket
+import sys
+from typing import Any, Callable, Dict, Optional
+
+from machine_failure.exception.custom_exception import CustomException
+from machine_failure.logger.custom_logging import logging
+
+def freeze_heap() -> None:
+  """
+  Move every object allocated so far into the permanent generation. The garbage collector
+  of a forked worker then never writes to those objects, so the pages holding the model
+  stay shared with the master instead of being copied on the first collection.
+  """
+  gc.collect()
+  gc.freeze()
+
+def fork_worker(target: Callable[[], None], after_fork: Optional[Callable[[], None]] = None) -> int:
+  """
+  Fork a child that runs target and exits, return its pid in the parent
+  """
+  pid = os.fork()
+  if pid == 0:
+    exit_code = 0
+    try:
+      signal.signal(signal.SIGINT, signal.SIG_DFL)
+      signal.signal(signal.SIGTERM, signal.SIG_DFL)
+      if after_fork is not None:
+        after_fork()
+      target()
+    except BaseException as e:
+      logging.error(f"Worker {os.getpid()} failed: {e}")
+      exit_code = 1
+    finally:
+      os._exit(exit_code)
+  return pid
+
+def serve_prefork(app: Any, workers: int, host: str, port: int, preload: Optional[Callable[[], None]] = None,
+                  after_fork: Optional[Callable[[], None]] = None) -> None:
+  """
+  Serve app from several uvicorn worker processes forked from one master. preload runs in the
+  master before forking, so a model it loads and warms is inherited copy-on-write by every
+  worker instead of being downloaded and unpickled once per worker. Workers that die are
+  forked again from the master, SIGINT or SIGTERM stops all of them.
+  app: ASGI application
+  workers: int number of worker processes
+  preload: optional callable run once in the master
+  after_fork: optional callable run in each worker before it starts serving
+  """
+  import uvicorn
+
+  logging.info(f"Starting pre-fork server with {workers} workers on {host}:{port}")
+  try:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    if preload is not None:
+      preload()
+    freeze_heap()
+
+    def run_worker() -> None:
+      server = uvicorn.Server(uvicorn.Config(app, host=host, port=port))
+      server.run(sockets=[sock])
+
+    children: Dict[int, int] = {}
+    for index in range(workers):
+      children[fork_worker(run_worker, after_fork)] = index
+    logging.info(f"Forked workers {sorted(children)}")
+
+    stopping = False
+    def stop(signum, frame) -> None:
+      nonlocal stopping
+      stopping = True
+      for pid in children:
+        try:
+          os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+          pass
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    while children:
+      try:
+        pid, status = os.wait()
+      except ChildProcessError:
+        break
+      index = children.pop(pid, None)
+      if index is None or stopping:
+        continue
+      logging.warning(f"Worker {pid} exited with status {status}, forking a replacement")
+      children[fork_worker(run_worker, after_fork)] = index
+    sock.close()
+    logging.info("Pre-fork server stopped")
+  except Exception as e:
+    logging.error(f"Error in serve_prefork: {e}")
+    raise CustomException(e, sys)
@@ -0,0 +1,98 @@
+import asyncio
+import sys
+import time
+from typing import Any, Dict, Optional
+
+from machine_failure.exception.custom_exception import CustomException
+from machine_failure.logger.custom_logging import logging
+from machine_failure.serving.executor import InferenceExecutor
+from machine_failure.serving.metrics import registry
+
+class ModelReloader:
+  """
+  Class Name  : ModelReloader
+  Description : Polls the ETag of the served model object in S3 and, when it changes,
+                downloads and warms the new model off the request path before swapping it
+                in. Thread pools share one classifier whose model reference is swapped,
+                process pools are replaced by a freshly warmed pool.
+  Output      : dict describing the served model version
+  On Failure  : the reload error is raised, the previous model keeps serving
+  """
+  def __init__(self, classifier: Any, executor: InferenceExecutor, poll_interval_seconds: float, warm_up_batch_size: int):
+    self.classifier = classifier
+    self.executor = executor
+    self.poll_interval = poll_interval_seconds
+    self.warm_up_batch_size = warm_up_batch_size
+    self.served_version: Optional[str] = None
+    self.loaded_at: Optional[float] = None
+    self._lock = asyncio.Lock()
+    self._task: Optional[asyncio.Task] = None
+    self.reload_counter = registry.counter("model_reloads_total", "Number of times a new model version was swapped in")
+    self.reload_failure_counter = registry.counter("model_reload_failures_total", "Number of failed model reload attempts")
+    self.reload_histogram = registry.histogram("model_reload_seconds", "Time spent downloading and warming a new model")
+
+  def _set_served_version(self, version: Optional[str]) -> None:
+    if self.served_version is not None:
+      registry.gauge("served_model_info", "Model version currently served", labels={"version": self.served_version}).set(0)
+    self.served_version = version
+    self.loaded_at = time.time()
+    registry.gauge("served_model_info", "Model version currently served", labels={"version": str(version)}).set(1)
+
+  async def start(self, poll: bool = True) -> None:
+    """
+    Record the version loaded at startup, the prediction cache is keyed by it whether or not
+    hot reload polls for new versions
+    """
+    logging.info("Entered the start method of ModelReloader class")
+    self._set_served_version(await self.executor.run("get_model_version"))
+    if poll:
+      self._task = asyncio.create_task(self._poll())
+
+  async def stop(self) -> None:
+    logging.info("Entered the stop method of ModelReloader class")
+    if self._task is not None:
+      self._task.cancel()
+      try:
+        await self._task
+      except asyncio.CancelledError:
+        pass
+      self._task = None
+
+  async def _poll(self) -> None:
+    while True:
+      await asyncio.sleep(self.poll_interval)
+      try:
+        await self.reload()
+      except Exception as e:
+        logging.error(f"Model reload poll failed, keeping version {self.served_version}: {e}")
+
+  async def reload(self, force: bool = False) -> Dict[str, Any]:
+    async with self._lock:
+      loop = asyncio.get_running_loop()
+      try:
+        remote_version = await loop.run_in_executor(None, self.classifier.get_remote_version)
+        if not force and remote_version == self.served_version:
+          return self.status(reloaded=False)
+
+        logging.info(f"Reloading model: served {self.served_version}, available {remote_version}")
+        started_at = time.perf_counter()
+        if self.executor.kind == "thread":
+          # loading runs on the default executor so the inference workers stay free
+          version = await loop.run_in_executor(None, self.classifier.reload, self.warm_up_batch_size)
+        else:
+          await self.executor.replace_pool(self.warm_up_batch_size)
+          version = await self.executor.run("get_model_version")
+        self.reload_histogram.observe(time.perf_counter() - started_at)
+        self.reload_counter.inc()
+        self._set_served_version(version)
+        return self.status(reloaded=True)
+      except Exception as e:
+        self.reload_failure_counter.inc()
+        logging.error(f"Error in cls ModelReloader method reload: {e}")
+        raise CustomException(e, sys)
+
+  def status(self, reloaded: Optional[bool] = None) -> Dict[str, Any]:
+    status = {"version": self.served_version, "loaded_at": self.loaded_at}
+    if reloaded is not None:
+      status["reloaded"] = reloaded
+    return status
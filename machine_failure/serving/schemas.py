@@ -0,0 +1,93 @@
+import math
+from typing import Any, Dict, List, Literal, Optional, Union
+from pydantic import BaseModel, ConfigDict, Field, RootModel, field_validator, model_validator
+
+from machine_failure.pipeline.prediction_pipeline import FAILURE_FLAGS, INPUT_COLUMNS, MachineArrayData, MachineData
+
+MachineType = Literal['L', 'M', 'H']
+# dataset column names, as in CSV uploads, to the form field names
+FORM_FIELDS = {column: name for name, column in INPUT_COLUMNS.items()}
+
+class MachineReading(BaseModel):
+  """
+  JSON body of a single /predict request, the form fields with their types
+  """
+  model_config = ConfigDict(allow_inf_nan=False)
+
+  product_id: int
+  type: MachineType
+  air_temperature: float
+  process_temperature: float
+  rotational_speed: int
+  torque: float
+  tool_wear: int
+  TWF: int = Field(0, ge=0, le=1)
+  HDF: int = Field(0, ge=0, le=1)
+  PWF: int = Field(0, ge=0, le=1)
+  OSF: int = Field(0, ge=0, le=1)
+
+  @field_validator('product_id', mode='before')
+  @classmethod
+  def parse_product_id(cls, value: Union[int, str]) -> Union[int, str]:
+    # product ids arrive as the dataset value (M14860) or as the bare serial number
+    return str(value).lstrip('LMH') if isinstance(value, str) else value
+
+  def to_machine_data(self) -> MachineData:
+    return MachineData(**self.model_dump())
+
+class MachineReadingColumns(BaseModel):
+  """
+  Column-oriented JSON body of a /predict/batch request, one list per form field
+  """
+  model_config = ConfigDict(allow_inf_nan=False)
+
+  product_id: List[Union[int, str]]
+  type: List[MachineType]
+  air_temperature: List[float]
+  process_temperature: List[float]
+  rotational_speed: List[int]
+  torque: List[float]
+  tool_wear: List[int]
+  TWF: Optional[List[int]] = None
+  HDF: Optional[List[int]] = None
+  PWF: Optional[List[int]] = None
+  OSF: Optional[List[int]] = None
+
+  @model_validator(mode='after')
+  def check_lengths(self) -> "MachineReadingColumns":
+    lengths = {name: len(values) for name, values in self if values is not None}
+    if len(set(lengths.values())) > 1:
+      raise ValueError(f"All columns must have the same length, got {lengths}")
+    return self
+
+  def to_array_data(self) -> MachineArrayData:
+    return MachineArrayData.from_columns(self.model_dump(exclude_none=True))
+
+class MachineReadings(RootModel[List[MachineReading]]):
+  """
+  Row-oriented /predict/batch request, a JSON list of readings or the rows of a CSV upload.
+  Rows may use the form field names or the dataset column names, and every row is validated
+  like a single /predict reading.
+  """
+  @model_validator(mode='before')
+  @classmethod
+  def rename_columns(cls, rows: Any) -> Any:
+    if not isinstance(rows, list):
+      return rows
+    return [cls._form_fields(row) if isinstance(row, dict) else row for row in rows]
+
+  @staticmethod
+  def _form_fields(row: Dict[str, Any]) -> Dict[str, Any]:
+    row = {FORM_FIELDS.get(name, name): value for name, value in row.items()}
+    for flag in FAILURE_FLAGS:
+      # unticked flags are left out or, in a CSV upload, left empty and read as NaN
+      if row.get(flag) is None or (isinstance(row[flag], float) and math.isnan(row[flag])):
+        row.pop(flag, None)
+    return row
+
+  def __len__(self) -> int:
+    return len(self.root)
+
+  def to_array_data(self) -> MachineArrayData:
+    return MachineArrayData.from_columns({name: [getattr(reading, name) for reading in self.root]
+                                          for name in MachineReading.model_fields})
@@ -0,0 +1,126 @@
+import asyncio
+import json
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import numpy as np
+from pydantic import ValidationError
+from starlette.websockets import WebSocket, WebSocketDisconnect
+
+from machine_failure.entity.machine_state import MachineStateStore
+from machine_failure.logger.custom_logging import logging
+from machine_failure.pipeline.prediction_pipeline import MachineArrayData
+from machine_failure.serving.metrics import SIZE_BUCKETS, registry
+from machine_failure.serving.schemas import MachineReading
+
+OVERFLOW_POLICIES = ("drop", "block")
+
+class PredictionStream:
+  """
+  Class Name  : PredictionStream
+  Description : Serves one WebSocket connection streaming readings. Each text message holds one
+                reading as JSON (the MachineReading fields plus an optional id). Readings are
+                buffered up to max_buffered, the buffer is drained into one array per call of
+                predict_fn, and one prediction message per reading is sent back in order. With
+                the "drop" overflow policy, a reading arriving at a full buffer is answered with
+                a dropped status. With "block", the connection stops being read until there is
+                room, which slows the client down through TCP flow control. Given a
+                machine_state store, every scored reading updates the rolling state of its
+                machine and the prediction carries the rolling features. Dropped or failed
+                readings leave the state as it was.
+  Output      : {"id", "label", "status"} message per reading, plus "rolling" with machine_state
+  On Failure  : {"id", "status": "error", "error"} message, the connection stays open
+  """
+  def __init__(self, websocket: WebSocket, predict_fn: Callable[[MachineArrayData], Awaitable[np.ndarray]],
+               max_buffered: int, max_batch: int, overflow: str = "drop", machine_state: Optional[MachineStateStore] = None):
+    if overflow not in OVERFLOW_POLICIES:
+      raise ValueError(f"Unknown stream overflow policy: {overflow}")
+    self.websocket = websocket
+    self.predict_fn = predict_fn
+    self.max_batch = max_batch
+    self.overflow = overflow
+    self.machine_state = machine_state
+    self.buffer: asyncio.Queue = asyncio.Queue(maxsize=max_buffered)
+    self._send_lock = asyncio.Lock()
+    self.open_gauge = registry.gauge("stream_connections_open", "WebSocket prediction streams currently open")
+    self.latency_histogram = registry.histogram("stream_latency_seconds",
+                                                "Time from receiving a streamed reading to sending its prediction")
+    self.drain_histogram = registry.histogram("stream_drain_size", "Readings scored together from one stream buffer",
+                                              buckets=SIZE_BUCKETS)
+    self.machines_gauge = registry.gauge("machine_state_machines", "Machines with rolling state in this worker")
+
+  def _count(self, result: str, amount: int = 1) -> None:
+    registry.counter("stream_readings_total", "Streamed readings by outcome", labels={"result": result}).inc(amount)
+
+  async def _send(self, message: dict) -> None:
+    async with self._send_lock:
+      await self.websocket.send_text(json.dumps(message))
+
+  async def run(self) -> None:
+    await self.websocket.accept()
+    registry.counter("stream_connections_total", "WebSocket prediction streams opened").inc()
+    self.open_gauge.inc()
+    processor = asyncio.create_task(self._process())
+    try:
+      while True:
+        message = await self.websocket.receive_text()
+        received_at = time.perf_counter()
+        reading_id = None
+        try:
+          body = json.loads(message)
+          reading_id = body.get("id") if isinstance(body, dict) else None
+          reading = MachineReading.model_validate(body)
+          data = reading.to_machine_data().convert_to_array()
+        except (ValueError, ValidationError) as e:
+          self._count("invalid")
+          await self._send({"id": reading_id, "status": "error", "error": str(e)})
+          continue
+        if self.buffer.full() and self.overflow == "drop":
+          self._count("dropped")
+          await self._send({"id": reading_id, "status": "dropped"})
+          continue
+        await self.buffer.put((reading_id, data, received_at, reading))
+    except WebSocketDisconnect:
+      pass
+    finally:
+      processor.cancel()
+      try:
+        await processor
+      except (asyncio.CancelledError, WebSocketDisconnect, RuntimeError):
+        pass
+      self.open_gauge.dec()
+
+  def _update_machine_state(self, reading: MachineReading) -> Optional[Dict[str, float]]:
+    if self.machine_state is None:
+      return None
+    rolling = self.machine_state.features(reading.product_id, reading.tool_wear, reading.torque, reading.rotational_speed)
+    self.machines_gauge.set(len(self.machine_state))
+    return rolling
+
+  async def _drain(self) -> List[Tuple[Any, MachineArrayData, float, MachineReading]]:
+    items = [await self.buffer.get()]
+    while len(items) < self.max_batch and not self.buffer.empty():
+      items.append(self.buffer.get_nowait())
+    return items
+
+  async def _process(self) -> None:
+    # one drained batch per connection is in flight, the batcher coalesces it with other streams
+    while True:
+      items = await self._drain()
+      self.drain_histogram.observe(len(items))
+      try:
+        labels = await self.predict_fn(MachineArrayData.concat([data for _, data, _, _ in items]))
+      except Exception as e:
+        logging.error(f"Error in cls PredictionStream method _process: {e}")
+        self._count("error", len(items))
+        for reading_id, _, _, _ in items:
+          await self._send({"id": reading_id, "status": "error", "error": str(e)})
+        continue
+      for (reading_id, _, received_at, reading), label in zip(items, labels):
+        message = {"id": reading_id, "label": int(label), "status": 'Machine Failure' if label == 1 else 'Machine is OK'}
+        # updated in the order the readings are scored, which is the order they arrived
+        rolling = self._update_machine_state(reading)
+        if rolling is not None:
+          message["rolling"] = rolling
+        await self._send(message)
+        self.latency_histogram.observe(time.perf_counter() - received_at)
+      self._count("scored", len(items))
@@ -129,4 +129,32 @@ def drop_columns(df: pd.DataFrame, cols: list)-> pd.DataFrame:
     return df
   except Exception as e:
     logging.error(f"Error in drop_columns: {e}")
-    raise CustomException(e, sys)
\ No newline at end of file
+    raise CustomException(e, sys)
+
+def parse_product_id(product_id: pd.Series) -> pd.Series:
+  """
+  convert the Product ID column (e.g. M14860) to its integer serial number
+  product_id: pandas Series holding raw or already numeric product ids
+  return: pandas Series of int
+  """
+  try:
+    return product_id.astype(str).str.replace('M','').str.replace('L','').str.replace('H','').astype(int)
+  except Exception as e:
+    logging.error(f"Error in parse_product_id: {e}")
+    raise CustomException(e, sys)
+
+def prepare_prediction_features(df: pd.DataFrame, schema: dict) -> pd.DataFrame:
+  """
+  turn raw machine records into model input: drop the target, parse Product ID
+  and drop the schema drop_columns that are present
+  df: pandas DataFrame of raw records
+  schema: dict content of schema.yaml
+  return: pandas DataFrame
+  """
+  try:
+    df = df.drop(columns=[schema['target']], errors='ignore')
+    df['Product ID'] = parse_product_id(df['Product ID'])
+    return drop_columns(df, [col for col in schema['drop_columns'] if col in df.columns])
+  except Exception as e:
+    logging.error(f"Error in prepare_prediction_features: {e}")
+    raise CustomException(e, sys)
@@ -0,0 +1,42 @@
+import asyncio
+import numpy as np
+import pytest
+
+from machine_failure.exception.custom_exception import CustomException
+from machine_failure.pipeline.prediction_pipeline import MachineArrayData
+from machine_failure.serving.batcher import PredictionBatcher
+
+def make_reading(machine_type: str, product_id: float) -> MachineArrayData:
+  return MachineArrayData(np.array([[product_id, 300.0, 310.0, 1500.0, 40.0, 100.0, 0, 0, 0, 0]]), [machine_type])
+
+async def predict(data: MachineArrayData) -> np.ndarray:
+  # stands in for the model, which fails the whole array on an unknown category
+  if set(data.types) - {'L', 'M', 'H'}:
+    raise ValueError("Found unknown categories in column Type")
+  return data.numeric[:, 0].astype(int)
+
+def run_concurrently(batcher: PredictionBatcher, readings):
+  async def main():
+    await batcher.start()
+    try:
+      return await asyncio.gather(*(batcher.submit(reading) for reading in readings), return_exceptions=True)
+    finally:
+      await batcher.stop()
+  return asyncio.run(main())
+
+def test_invalid_reading_fails_only_its_own_request():
+  batcher = PredictionBatcher(predict, max_batch_size=64, max_wait_ms=50, concat_fn=MachineArrayData.concat)
+  readings = [make_reading('L', product_id) for product_id in range(9)] + [make_reading('X', 99)]
+  results = run_concurrently(batcher, readings)
+  assert [int(result[0]) for result in results[:9]] == list(range(9))
+  assert isinstance(results[9], CustomException)
+
+def test_invalid_reading_is_rejected_before_enqueue():
+  batcher = PredictionBatcher(predict, max_batch_size=64, max_wait_ms=50, concat_fn=MachineArrayData.concat,
+                              validate_fn=MachineArrayData.validate)
+  readings = [make_reading('M', product_id) for product_id in range(9)] + [make_reading('X', 99)]
+  results = run_concurrently(batcher, readings)
+  assert [int(result[0]) for result in results[:9]] == list(range(9))
+  assert isinstance(results[9], ValueError)
+  with pytest.raises(ValueError):
+    make_reading('H', float('nan')).validate()
@@ -0,0 +1,66 @@
+import asyncio
+import json
+import numpy as np
+import pandas as pd
+from starlette.websockets import WebSocketDisconnect
+
+from machine_failure.entity.machine_state import ROLLING_FEATURES, MachineStateStore, replay_rolling_features
+from machine_failure.serving.stream import PredictionStream
+
+def make_readings(n: int = 40, seed: int = 7) -> pd.DataFrame:
+  rng = np.random.default_rng(seed)
+  return pd.DataFrame({
+    'id': np.arange(n),
+    # three machines interleaved, more than the store keeps, so eviction is replayed as well
+    'Product ID': rng.choice(['M14860', 'L47181', 'H29424'], n),
+    'Type': 'M',
+    'Air temperature [K]': 298.1,
+    'Process temperature [K]': 308.6,
+    'Rotational speed [rpm]': rng.integers(1200, 2900, n),
+    'Torque [Nm]': rng.normal(40.0, 10.0, n).round(1),
+    'Tool wear [min]': np.cumsum(rng.integers(0, 5, n)),
+  })
+
+class FakeWebSocket:
+  def __init__(self, messages):
+    self.messages = list(messages)
+    self.expected = len(self.messages)
+    self.sent = []
+
+  async def accept(self):
+    pass
+
+  async def receive_text(self):
+    if self.messages:
+      return self.messages.pop(0)
+    # the client hangs up once every reading is answered
+    while len(self.sent) < self.expected:
+      await asyncio.sleep(0.001)
+    raise WebSocketDisconnect()
+
+  async def send_text(self, text):
+    self.sent.append(json.loads(text))
+
+async def predict(data):
+  return np.zeros(len(data), dtype=int)
+
+def stream_rolling_features(readings: pd.DataFrame, window: int, max_machines: int):
+  messages = [json.dumps({'id': int(row['id']), 'product_id': row['Product ID'], 'type': row['Type'],
+                          'air_temperature': row['Air temperature [K]'], 'process_temperature': row['Process temperature [K]'],
+                          'rotational_speed': int(row['Rotational speed [rpm]']), 'torque': float(row['Torque [Nm]']),
+                          'tool_wear': int(row['Tool wear [min]'])}) for _, row in readings.iterrows()]
+  websocket = FakeWebSocket(messages)
+  stream = PredictionStream(websocket, predict, max_buffered=64, max_batch=8, overflow="block",
+                            machine_state=MachineStateStore(window, max_machines))
+  asyncio.run(stream.run())
+  return {message['id']: [message['rolling'][name] for name in ROLLING_FEATURES] for message in websocket.sent}
+
+def test_offline_replay_matches_streaming():
+  readings = make_readings()
+  streamed = stream_rolling_features(readings, window=3, max_machines=2)
+  # replayed from a shuffled frame, the id column restores the order the readings were taken in
+  shuffled = readings.sample(frac=1, random_state=0)
+  offline = replay_rolling_features(shuffled, MachineStateStore(3, 2))
+  assert len(streamed) == len(readings)
+  for index, row in shuffled.iterrows():
+    np.testing.assert_allclose(offline.loc[index, ROLLING_FEATURES].to_numpy(dtype=float), streamed[row['id']])
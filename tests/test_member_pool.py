@@ -0,0 +1,19 @@
+import threading
+import time
+
+from machine_failure.entity import model
+
+def member_threads() -> int:
+  return sum(thread.name.startswith("voting-member") for thread in threading.enumerate())
+
+def test_growing_the_member_pool_shuts_the_old_one_down():
+  assert [future.result() for future in model._submit_members([(abs, -1), (abs, -2)])] == [1, 2]
+  old_pool = model._member_pool
+  assert [future.result() for future in model._submit_members([(abs, -1), (abs, -2), (abs, -3)])] == [1, 2, 3]
+  assert model._member_pool is not old_pool
+  assert old_pool._shutdown
+  # the old threads exit, only the new pool's remain
+  deadline = time.monotonic() + 5
+  while member_threads() > model._member_pool_size and time.monotonic() < deadline:
+    time.sleep(0.01)
+  assert member_threads() <= model._member_pool_size
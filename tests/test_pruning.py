@@ -0,0 +1,31 @@
+import numpy as np
+import optuna
+from optuna.trial import TrialState
+from sklearn.datasets import make_classification
+from sklearn.ensemble import RandomForestClassifier
+
+from machine_failure.components.model_trainer import PruningReporter
+from machine_failure.entity.training_datasets import TrainingDatasets
+
+def make_datasets() -> TrainingDatasets:
+  X, y = make_classification(n_samples=1200, n_features=12, n_informative=6, flip_y=0.05, random_state=0)
+  return TrainingDatasets(X[:800], y[:800], X[800:], y[800:])
+
+def test_worse_forest_trial_is_pruned():
+  datasets = make_datasets()
+  study = optuna.create_study(direction="maximize", pruner=optuna.pruners.MedianPruner(n_startup_trials=2))
+  # n_estimators differ between the trials, as they do when tuned
+  trials = [dict(n_estimators=120, max_depth=None), dict(n_estimators=150, max_depth=None),
+            dict(n_estimators=130, max_depth=1, max_features=1)]
+
+  def objective(trial):
+    model = RandomForestClassifier(random_state=0, **trials[trial.number])
+    model = datasets.fit(model, PruningReporter(trial).report, forest_step_trees=50)
+    return float(np.mean(model.predict(datasets.X_test) == datasets.y_test))
+
+  study.optimize(objective, n_trials=len(trials))
+  states = [trial.state for trial in study.trials]
+  assert states == [TrialState.COMPLETE, TrialState.COMPLETE, TrialState.PRUNED]
+  # every trial reported at the same tree counts
+  assert all(set(trial.intermediate_values) >= {50, 100} for trial in study.trials[:2])
+  assert list(study.trials[2].intermediate_values) == [50]
@@ -0,0 +1,37 @@
+import pytest
+from pydantic import ValidationError
+
+from machine_failure.pipeline.prediction_pipeline import MachineBatchData
+from machine_failure.serving.schemas import MachineReadings
+
+READING = {'product_id': 'M14860', 'type': 'M', 'air_temperature': 298.1, 'process_temperature': 308.6,
+           'rotational_speed': 1551, 'torque': 42.8, 'tool_wear': 0}
+
+CSV = b"""Product ID,Type,Air temperature [K],Process temperature [K],Rotational speed [rpm],Torque [Nm],Tool wear [min],TWF
+H20904,H,297.5,312.8,2520,32.2,213,
+L12400,L,303.0,311.0,1795,22.8,44,1
+"""
+
+def test_batch_rows_become_arrays():
+  data = MachineReadings.model_validate([READING, {**READING, 'type': 'L', 'TWF': 1}]).to_array_data()
+  assert data.types == ['M', 'L']
+  assert data.numeric[:, 0].tolist() == [14860, 14860]
+
+def test_csv_rows_use_the_dataset_column_names():
+  data = MachineReadings.model_validate(MachineBatchData.from_csv(CSV).records).to_array_data()
+  assert data.types == ['H', 'L']
+  assert data.numeric[:, 0].tolist() == [20904, 12400]
+  # the empty TWF cell is an unticked flag
+  assert data.numeric[:, 6].tolist() == [0, 1]
+
+@pytest.mark.parametrize("field, value", [('air_temperature', None), ('air_temperature', float('nan')), ('type', 'Q'),
+                                          ('torque', 'high')])
+def test_invalid_row_fails_validation(field, value):
+  with pytest.raises(ValidationError) as error:
+    MachineReadings.model_validate([READING, {**READING, field: value}])
+  # the error names the row and the field
+  assert error.value.errors()[0]['loc'][:2] == (1, field)
+
+def test_missing_csv_value_fails_validation():
+  with pytest.raises(ValidationError):
+    MachineReadings.model_validate(MachineBatchData.from_csv(CSV.replace(b"297.5", b"")).records)
@@ -0,0 +1,34 @@
+from optuna.trial import TrialState
+
+from machine_failure.components.model_trainer import ModelTrainer
+from machine_failure.entity.artifact_entity import DataTransformationArtifact
+
+def make_trainer(run: str) -> ModelTrainer:
+  trainer = ModelTrainer(DataTransformationArtifact("preprocessor.pkl", "train.npy", "test.npy"))
+  trainer.model_schema["optuna"]["warm_start"] = {"enabled": True, "n_trials": 3, "enqueue_best": 1}
+  trainer.run = run
+  return trainer
+
+def complete_trial(study, run: str, value: float) -> None:
+  trial = study.ask()
+  trial.set_user_attr("run", run)
+  trial.suggest_float("learning_rate", 0.01, 0.3)
+  study.tell(trial, value)
+
+def test_warm_start_skips_a_run_without_completed_trials(tmp_path):
+  storage_spec = ("journal", str(tmp_path / "studies.log"))
+  study = make_trainer("run1")._create_study("xgb", storage_spec)
+  study.enqueue_trial({"learning_rate": 0.1})
+  complete_trial(study, "run1", 0.9)
+
+  # killed before any trial completed, its enqueued trial is still waiting
+  crashed = make_trainer("run2")._create_study("xgb", storage_spec)
+  assert crashed.user_attrs["warm_start_from"] == "run1"
+
+  study = make_trainer("run3")._create_study("xgb", storage_spec)
+  assert study.user_attrs["warm_start_from"] == "run1"
+  assert study.user_attrs["n_trials"] == 3
+  # the best trial of run1 is waiting once, not enqueued again by every later run
+  waiting = study.get_trials(states=(TrialState.WAITING,))
+  assert [trial.user_attrs["enqueued_from"] for trial in waiting] == [0]
+  assert study.ask().suggest_float("learning_rate", 0.01, 0.3) == 0.1